@@ -1,5 +1,5 @@
 from fastapi import FastAPI, UploadFile, File,Form 
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, PlainTextResponse
 from fastapi.requests import Request
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
@@ -8,13 +8,17 @@ from pathlib import Path
 import shutil,uuid, json
 from src.main import main
 from src.progress import WebSocketManager, log_queue
+from src.metrics import jobs_inflight, jobs_total, render_metrics
+from src.browser import browser_pool
 import asyncio
 from contextlib import asynccontextmanager
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     asyncio.create_task(log_sender())
+    browser_pool.keep_open()
     yield
+    await browser_pool.close()
 
 app = FastAPI(lifespan=lifespan)
 templates = Jinja2Templates(directory="app/templates")
@@ -43,6 +47,7 @@ async def generate(
     theme_author_email: str = Form(None),
     website_type: str = Form(None),
     demo_url: str = Form(None),
+    profile: bool = Form(False),
   ):
     
 
@@ -63,13 +68,29 @@ async def generate(
     "AUTHOR_EMAIL": theme_author_email,
     "DEMO_URL": demo_url
     }
-    output_zip = await main(zip_path, theme_data)
+    jobs_inflight.inc()
+    try:
+        # unchecked keeps the PROFILE env default
+        output_zip = await main(zip_path, theme_data, profile=profile or None)
+    except Exception:
+        jobs_total.inc(outcome="error")
+        raise
+    finally:
+        jobs_inflight.dec()
+    jobs_total.inc(outcome="ok")
+
     output_filename = Path(output_zip).name
     return FileResponse(output_zip,
                         media_type="application/zip",
                         filename=output_filename)
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(),
+                             media_type="text/plain; version=0.0.4")
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await ws_manager.connect(websocket)
@@ -0,0 +1,313 @@
+"""
+End-to-end conversion benchmark against the local stub LLM.
+
+    python -m benchmarks.e2e run --pages 10 --sections 8 --repeat 3
+    python -m benchmarks.e2e compare HEAD~1 HEAD
+
+`run` generates a synthetic theme, converts it with src.main.main in a
+fresh process per repetition (so peak RSS is per run) and writes the
+medians to benchmarks/results/<commit>.json. `compare` takes two result
+files or commits and prints the deltas, failing when wall time regressed
+more than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+THEME_NAME = "bench-theme"
+# read-only files the src modules open relative to the cwd
+REPO_RESOURCES = ("prompt", "sample_page.mustache", "sample_config.json", "sample_README.md")
+
+
+def git_commit(ref="HEAD") -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", ref], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def git_dirty() -> bool:
+    result = subprocess.run(
+        ["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+        capture_output=True, text=True
+    )
+    return bool(result.stdout.strip())
+
+
+def peak_rss_bytes() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def make_workdir(prefix: str) -> Path:
+    """
+    A temp directory to run the converter in, with the repo's resources
+    linked in, so its temp/, logs/ and outputs never land in the checkout
+    """
+    workdir = Path(tempfile.mkdtemp(prefix=prefix))
+    for name in REPO_RESOURCES:
+        (workdir / name).symlink_to(ROOT / name)
+    return workdir
+
+
+def load_settings():
+    """Local .env (loaded by the src package), with anything it does not set taken from sample.env"""
+    from dotenv import dotenv_values
+    import src  # noqa: F401
+    for key, value in dotenv_values(ROOT / "sample.env").items():
+        if value is not None:
+            os.environ.setdefault(key, value)
+
+
+def run_once(args):
+    """One conversion in this process; writes its measurements to args.result"""
+    from src.stub_llm import StubConfig, start_stub_server
+
+    config = StubConfig(
+        latency_median=args.latency, latency_sigma=args.latency_sigma,
+        rate_429=args.rate_429, rate_500=args.rate_500,
+        rate_empty=args.rate_empty, rate_malformed=args.rate_malformed,
+        retry_after="0", seed=args.seed, models=["stub-model"],
+    )
+    server, base_url = start_stub_server(port=0, config=config)
+
+    load_settings()
+    os.environ.update({
+        "NVIDIA_BASE_URL": base_url,
+        "USE": "NVIDIA",
+        "MODEL_NAME": "stub-model",
+        "SKIP_SCREENSHOT": "1",
+        "LLM_CASSETTE_MODE": "off",
+        "LLM_CACHE_DIR": args.cache_dir,
+    })
+
+    from src.main import main
+    from src.stages import stage_stats
+
+    theme_data = {
+        "THEME_NAME": "Bench Theme",
+        "VERSION": "1.0.0",
+        "CATEGORY": "business",
+        "SUBCATEGORY": "corporate",
+        "WEBSITE_TYPE": "both",
+        "AUTHOR": "Bench",
+        "AUTHOR_EMAIL": "bench@example.com",
+        "DEMO_URL": "https://example.com",
+    }
+
+    started = time.perf_counter()
+    asyncio.run(main(args.theme, theme_data))
+    wall = time.perf_counter() - started
+
+    llm = server.RequestHandlerClass.stats.snapshot()
+    server.shutdown()
+
+    faults = sum(n for kind, n in llm["counts"].items() if kind.startswith("fault_"))
+    result = {
+        "wall_seconds": wall,
+        "stages": {name: entry["seconds"] for name, entry in stage_stats().items()},
+        "peak_rss_bytes": peak_rss_bytes(),
+        "llm_requests": sum(llm["counts"].values()),
+        "llm_faults": faults,
+        "llm_requests_by_kind": llm["counts"],
+        "prompt_tokens": llm["prompt_tokens"],
+        "completion_tokens": llm["completion_tokens"],
+    }
+    Path(args.result).write_text(json.dumps(result, indent=2), encoding="utf-8")
+
+
+def summarize(runs: list) -> dict:
+    stages = sorted({name for r in runs for name in r["stages"]})
+    return {
+        "wall_seconds": statistics.median(r["wall_seconds"] for r in runs),
+        "wall_seconds_all": [r["wall_seconds"] for r in runs],
+        "stages": {
+            name: statistics.median(r["stages"].get(name, 0.0) for r in runs)
+            for name in stages
+        },
+        "peak_rss_bytes": max(r["peak_rss_bytes"] for r in runs),
+        "llm_requests": statistics.median(r["llm_requests"] for r in runs),
+        "llm_faults": statistics.median(r["llm_faults"] for r in runs),
+        "prompt_tokens": statistics.median(r["prompt_tokens"] for r in runs),
+        "completion_tokens": statistics.median(r["completion_tokens"] for r in runs),
+        "llm_requests_by_kind": runs[-1]["llm_requests_by_kind"],
+    }
+
+
+def run(args):
+    from benchmarks.synthetic_theme import make_theme
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-"))
+    theme = workdir / f"{THEME_NAME}.zip"
+    theme_info = make_theme(theme, args.pages, args.sections,
+                            args.duplication, args.assets, args.seed)
+    print(f"Theme: {theme_info}")
+
+    runs = []
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    try:
+        for i in range(args.repeat):
+            result_file = workdir / f"run-{i}.json"
+            # cold LLM cache per run unless --warm-cache
+            cache_dir = workdir / ("cache" if args.warm_cache else f"cache-{i}")
+            command = [
+                sys.executable, "-m", "benchmarks.e2e", "once",
+                "--theme", str(theme), "--result", str(result_file),
+                "--cache-dir", str(cache_dir),
+                "--latency", str(args.latency), "--latency-sigma", str(args.latency_sigma),
+                "--rate-429", str(args.rate_429), "--rate-500", str(args.rate_500),
+                "--rate-empty", str(args.rate_empty), "--rate-malformed", str(args.rate_malformed),
+                "--seed", str(args.seed),
+            ]
+            rundir = make_workdir("bench-run-")
+            try:
+                subprocess.run(command, cwd=rundir, env=env, check=True,
+                               stdout=None if args.verbose else subprocess.DEVNULL,
+                               stderr=None if args.verbose else subprocess.DEVNULL)
+            finally:
+                shutil.rmtree(rundir, ignore_errors=True)
+            runs.append(json.loads(result_file.read_text(encoding="utf-8")))
+            print(f"Run {i + 1}/{args.repeat}: {runs[-1]['wall_seconds']:.2f}s")
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "dirty": git_dirty(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "theme": theme_info,
+        "stub": {
+            "latency": args.latency, "latency_sigma": args.latency_sigma,
+            "rate_429": args.rate_429, "rate_500": args.rate_500,
+            "rate_empty": args.rate_empty, "rate_malformed": args.rate_malformed,
+        },
+        "repeat": args.repeat,
+        "warm_cache": args.warm_cache,
+        "result": summarize(runs),
+    }
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{commit or 'local'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Results written to {output}")
+    print_report(report)
+
+
+def load_result(ref: str) -> dict:
+    path = Path(ref)
+    if not path.exists():
+        commit = git_commit(ref)
+        path = RESULTS_DIR / f"{commit}.json"
+        if not commit or not path.exists():
+            raise SystemExit(f"No benchmark result for {ref} (expected {path})")
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def print_report(report: dict):
+    result = report["result"]
+    print(f"wall        {result['wall_seconds']:.2f}s")
+    for name, seconds in result["stages"].items():
+        print(f"  {name:<22}{seconds:.2f}s")
+    print(f"peak RSS    {result['peak_rss_bytes'] / 2**20:.1f} MiB")
+    print(f"LLM calls   {result['llm_requests']:g} ({result['llm_faults']:g} faults)")
+    print(f"tokens      {result['prompt_tokens']:g} in / {result['completion_tokens']:g} out")
+
+
+def delta(old, new) -> str:
+    if not old:
+        return "    n/a"
+    return f"{(new - old) / old * 100:+6.1f}%"
+
+
+def compare(args):
+    base, head = load_result(args.base), load_result(args.head)
+    if base["theme"] != head["theme"] or base["stub"] != head["stub"]:
+        print("warning: results were produced with different theme/stub settings")
+
+    b, h = base["result"], head["result"]
+    print(f"{'':<26}{base['commit'] or args.base:>11}{'':3}{head['commit'] or args.head:>11}")
+
+    rows = [("wall_seconds", b["wall_seconds"], h["wall_seconds"])]
+    for name in sorted(set(b["stages"]) | set(h["stages"])):
+        rows.append((f"  {name}", b["stages"].get(name, 0.0), h["stages"].get(name, 0.0)))
+    for key in ("peak_rss_bytes", "llm_requests", "prompt_tokens", "completion_tokens"):
+        rows.append((key, b[key], h[key]))
+
+    for name, old, new in rows:
+        unit = ""
+        if name == "peak_rss_bytes":
+            old, new, unit = old / 2**20, new / 2**20, "MiB"
+        print(f"{name:<26}{old:>11.2f}{unit:<3}{new:>11.2f}{unit:<3} {delta(old, new)}")
+
+    regression = (h["wall_seconds"] - b["wall_seconds"]) / b["wall_seconds"]
+    if regression > args.tolerance:
+        print(f"Wall time regressed by {regression:.1%} (tolerance {args.tolerance:.0%})")
+        sys.exit(1)
+
+
+def add_stub_args(parser):
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="stub median latency in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-500", type=float, default=0.0)
+    parser.add_argument("--rate-empty", type=float, default=0.0)
+    parser.add_argument("--rate-malformed", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end conversion benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="benchmark the current tree")
+    run_parser.add_argument("--pages", type=int, default=5)
+    run_parser.add_argument("--sections", type=int, default=6)
+    run_parser.add_argument("--duplication", type=float, default=0.3)
+    run_parser.add_argument("--assets", type=int, default=10)
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--warm-cache", action="store_true",
+                            help="share the LLM response cache between repetitions")
+    run_parser.add_argument("--output", help="result file (default benchmarks/results/<commit>.json)")
+    run_parser.add_argument("--keep", action="store_true", help="keep the generated theme")
+    run_parser.add_argument("--verbose", action="store_true", help="show pipeline logs")
+    add_stub_args(run_parser)
+
+    once_parser = commands.add_parser("once", help=argparse.SUPPRESS)
+    once_parser.add_argument("--theme", required=True)
+    once_parser.add_argument("--result", required=True)
+    once_parser.add_argument("--cache-dir", required=True)
+    add_stub_args(once_parser)
+
+    compare_parser = commands.add_parser("compare", help="compare two results")
+    compare_parser.add_argument("base", help="result file or commit")
+    compare_parser.add_argument("head", nargs="?", default="HEAD", help="result file or commit")
+    compare_parser.add_argument("--tolerance", type=float, default=0.10,
+                                help="allowed wall time regression (fraction)")
+
+    args = parser.parse_args()
+    {"run": run, "once": run_once, "compare": compare}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Micro-benchmarks for the CPU-bound HTML paths.
+
+    python -m benchmarks.micro                     # run, save results/micro-<commit>.json
+    python -m benchmarks.micro --compare HEAD~1    # also fail on regressions
+    python -m benchmarks.micro -k skeleton         # only matching benchmarks
+
+Each benchmark times single calls (per-call setup is excluded) until
+--min-time has passed. With --compare, a benchmark whose median got slower
+than the baseline by more than its tolerance in micro_thresholds.json
+(or "default") fails the run.
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("TQDM_DISABLE", "1")
+
+from benchmarks.e2e import ROOT, RESULTS_DIR, git_commit, git_dirty, load_settings, make_workdir
+from benchmarks.synthetic_theme import KINDS, layout_html, section_html
+
+THRESHOLDS_FILE = ROOT / "benchmarks" / "micro_thresholds.json"
+DB_SIZES = (100, 1000, 10000)
+
+BENCHMARKS = {}
+
+
+def bench(name: str, setup=None):
+    """Register fn(*setup()) as a benchmark; setup runs before every call, untimed"""
+    def decorator(fn):
+        BENCHMARKS[name] = (fn, setup)
+        return fn
+    return decorator
+
+
+def time_benchmark(fn, setup, min_time: float, min_rounds: int, max_rounds: int) -> dict:
+    args = setup() if setup else ()
+    fn(*args)  # warm-up
+
+    durations = []
+    total = 0.0
+    while len(durations) < min_rounds or (total < min_time and len(durations) < max_rounds):
+        args = setup() if setup else ()
+        started = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - started
+        durations.append(elapsed)
+        total += elapsed
+
+    return {
+        "rounds": len(durations),
+        "min": min(durations),
+        "median": statistics.median(durations),
+        "mean": statistics.mean(durations),
+        "stdev": statistics.stdev(durations) if len(durations) > 1 else 0.0,
+    }
+
+
+def make_page(rng, sections: int, images: list) -> str:
+    blocks = [
+        section_html(rng, rng.choice(KINDS), i, images).replace(
+            "</section>", "<div><div></div></div></section>"
+        )
+        for i in range(sections)
+    ]
+    return layout_html("Bench", "\n".join(blocks), ["index", "about", "contact"])
+
+
+def make_blocks(rng, count: int) -> list:
+    return [section_html(rng, rng.choice(KINDS), i, []) for i in range(count)]
+
+
+def register_benchmarks(workdir: Path):
+    import random
+    from bs4 import BeautifulSoup
+    from src.stub_llm import StubConfig, analysis_response, start_stub_server
+
+    # importing the LLM modules builds clients that list models; keep that local
+    _, base_url = start_stub_server(port=0, config=StubConfig(latency_median=0,
+                                                              models=["stub-model"]))
+    os.environ.update({"NVIDIA_BASE_URL": base_url, "USE": "NVIDIA", "MODEL_NAME": "stub-model"})
+
+    from src import save_shortcode
+    from src.create_default import build_layout, remove_empty_divs, rewrite_html_assets
+    from src.helper import process_html_path
+    from src.separate_div import extract_components
+
+    rng = random.Random(0)
+    images = [f"img/photo-{i}.jpg" for i in range(20)] + ["/assets/images/logo.png"]
+    section = section_html(rng, "features", 1, images)
+    page = make_page(rng, 60, images)
+
+    def uncached(html):
+        # fingerprint() memoizes by content; time the parse, not the lookup
+        save_shortcode._fingerprints.clear()
+        return (html,)
+
+    bench("html_skeleton", setup=lambda: uncached(section))(save_shortcode.html_skeleton)
+    bench("skeleton_hash", setup=lambda: uncached(section))(save_shortcode.skeleton_hash)
+    bench("fingerprint_cached", setup=lambda: (section,))(save_shortcode.fingerprint)
+
+    for size in DB_SIZES:
+        # a standalone index, the global one is backed by temp/
+        index = save_shortcode.SimilarityIndex(workdir / f"blocks-{size}.jsonl")
+        index.db_file.touch()
+        index.items = []
+        blocks = make_blocks(rng, size)
+        for i, block in enumerate(blocks):
+            skel, h = save_shortcode.fingerprint(block)
+            index.add({"name": f"block-{i}", "hash": h}, skel)
+
+        known = blocks[size // 2]
+        unknown = section_html(random.Random(size), "pricing", 10**6, images)
+
+        def lookup(html, index=index):
+            previous = save_shortcode.processed_index
+            save_shortcode.processed_index = index
+            try:
+                return save_shortcode.is_already_processed(html)
+            finally:
+                save_shortcode.processed_index = previous
+
+        bench(f"is_already_processed[{size}] hit", setup=lambda h=known: uncached(h))(lookup)
+        bench(f"is_already_processed[{size}] miss", setup=lambda h=unknown: uncached(h))(lookup)
+
+    html_file = workdir / "page.html"
+    html_file.write_text(page, encoding="utf-8")
+    config = analysis_response(page)
+    config_file = workdir / "page.json"
+    config_file.write_text(json.dumps(config), encoding="utf-8")
+
+    partials = [c for c in config if c["type"] == "partial"]
+    shortcodes = [c for c in config if c["type"] != "partial"]
+    partials_file = workdir / "partials.json"
+    shortcodes_file = workdir / "shortcodes.json"
+    partials_file.write_text(json.dumps(partials), encoding="utf-8")
+    shortcodes_file.write_text(json.dumps(shortcodes), encoding="utf-8")
+
+    bench("extract_components[60 sections]")(
+        lambda: extract_components(html_file, config_file, "bench")
+    )
+    bench("build_layout[60 sections]")(
+        lambda: build_layout(html_file, workdir / "theme", partials_file,
+                             shortcodes_file, "default.mustache")
+    )
+
+    parse = lambda: (BeautifulSoup(page, "html.parser"),)
+    bench("process_html_path", setup=parse)(process_html_path)
+    bench("rewrite_html_assets", setup=parse)(rewrite_html_assets)
+    bench("remove_empty_divs", setup=parse)(remove_empty_divs)
+
+
+def load_baseline(ref: str) -> dict:
+    path = Path(ref)
+    if not path.exists():
+        commit = git_commit(ref)
+        path = RESULTS_DIR / f"micro-{commit}.json"
+        if not commit or not path.exists():
+            raise SystemExit(f"No micro-benchmark result for {ref} (expected {path})")
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def compare(results: dict, baseline: dict) -> list:
+    thresholds = json.loads(THRESHOLDS_FILE.read_text(encoding="utf-8"))
+    default = thresholds.get("default", 0.2)
+
+    failures = []
+    print(f"\n{'benchmark':<40}{'base':>12}{'now':>12}{'change':>9}")
+    for name, stats in results.items():
+        old = baseline["benchmarks"].get(name)
+        if not old:
+            continue
+
+        change = (stats["median"] - old["median"]) / old["median"]
+        tolerance = thresholds.get(name, default)
+        flag = "  REGRESSION" if change > tolerance else ""
+        print(f"{name:<40}{old['median'] * 1e3:>10.3f}ms{stats['median'] * 1e3:>10.3f}ms"
+              f"{change:>+8.1%}{flag}")
+        if flag:
+            failures.append(name)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the HTML hot paths")
+    parser.add_argument("-k", dest="filter", help="only benchmarks containing this text")
+    parser.add_argument("--min-time", type=float, default=0.5,
+                        help="seconds of timed calls per benchmark")
+    parser.add_argument("--min-rounds", type=int, default=5)
+    parser.add_argument("--max-rounds", type=int, default=100000)
+    parser.add_argument("--compare", help="baseline result file or commit")
+    parser.add_argument("--output", help="result file (default benchmarks/results/micro-<commit>.json)")
+    args = parser.parse_args()
+
+    # src modules read prompts relative to the cwd at import time, and
+    # extract_components/build_layout write relative to it
+    cwd = os.getcwd()
+    workdir = make_workdir("micro-")
+    os.chdir(workdir)
+    load_settings()
+    register_benchmarks(workdir)
+    logging.getLogger("ShortCodeConverter").setLevel(logging.WARNING)
+
+    results = {}
+    try:
+        for name, (fn, setup) in BENCHMARKS.items():
+            if args.filter and args.filter not in name:
+                continue
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = time_benchmark(fn, setup, args.min_time,
+                                       args.min_rounds, args.max_rounds)
+            results[name] = stats
+            print(f"{name:<40}{stats['median'] * 1e3:>10.3f}ms median "
+                  f"({stats['min'] * 1e3:.3f}ms min, {stats['rounds']} rounds)")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "dirty": git_dirty(),
+        "python": sys.version.split()[0],
+        "benchmarks": results,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"micro-{commit or 'local'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Results written to {output}")
+
+    if args.compare:
+        failures = compare(results, load_baseline(args.compare))
+        if failures:
+            print(f"{len(failures)} benchmark(s) regressed past their threshold")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Synthetic HTML theme zips for benchmarking.
+
+    python -m benchmarks.synthetic_theme out.zip --pages 10 --sections 8
+
+Every page shares one header/footer; each body section is either a copy of
+a section already emitted (with probability `duplication`) or a new variant,
+so the shortcode dedup path sees a known share of repeats.
+"""
+import argparse
+import io
+import random
+import zipfile
+from pathlib import Path
+
+KINDS = ["hero", "features", "testimonials", "pricing", "cta", "gallery", "team", "faq"]
+PAGE_NAMES = ["index", "about", "services", "contact", "blog", "portfolio", "shop", "faq"]
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua enim minim veniam"
+).split()
+
+
+def text(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize()
+
+
+def png_bytes(rng: random.Random, size: int) -> bytes:
+    """Small valid PNG, size x size pixels of one random color"""
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new("RGB", (size, size), tuple(rng.randrange(256) for _ in range(3))).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def section_html(rng: random.Random, kind: str, variant: int, images: list) -> str:
+    items = []
+    for i in range(rng.randint(2, 6)):
+        img = f'<img src="{rng.choice(images)}" alt="{kind} {i}">' if images and rng.random() < 0.5 else ""
+        items.append(
+            f'<div class="{kind}-item col-md-4">{img}'
+            f'<h3 class="{kind}-title">{text(rng, 3)}</h3>'
+            f'<p>{text(rng, rng.randint(8, 30))}</p>'
+            f'<a href="#" class="btn btn-{kind}">{text(rng, 2)}</a></div>'
+        )
+
+    return (
+        f'<section class="{kind}-section {kind}-v{variant}">'
+        f'<div class="container"><div class="section-heading">'
+        f'<h2>{text(rng, 4)}</h2><p>{text(rng, 12)}</p></div>'
+        f'<div class="row">{"".join(items)}</div></div></section>'
+    )
+
+
+def layout_html(title: str, body: str, pages: list) -> str:
+    links = "".join(f'<li><a href="{p}.html">{p.title()}</a></li>' for p in pages)
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<link rel="stylesheet" href="assets/css/style.css">
+</head>
+<body>
+<header class="site-header sticky-top">
+<div class="container"><a class="logo" href="index.html">Synthetic</a>
+<nav class="main-menu" aria-label="main menu"><ul>{links}</ul></nav></div>
+</header>
+<main class="page-content">
+{body}
+</main>
+<footer class="site-footer">
+<div class="container"><nav class="footer-links" aria-label="quick links"><ul>{links}</ul></nav>
+<p>Copyright Synthetic Theme</p></div>
+</footer>
+<script src="assets/js/main.js"></script>
+</body>
+</html>
+"""
+
+
+def make_theme(path, pages=5, sections=6, duplication=0.3, assets=10, seed=0) -> dict:
+    """Write a theme zip to path, returns a summary of what it contains"""
+    rng = random.Random(seed)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    names = [PAGE_NAMES[i] if i < len(PAGE_NAMES) else f"page-{i}" for i in range(pages)]
+    images = [f"assets/images/img-{i}.png" for i in range(assets)]
+
+    emitted = []
+    duplicates = 0
+    variants = {}
+    root = path.stem
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name in names:
+            blocks = []
+            for _ in range(sections):
+                if emitted and rng.random() < duplication:
+                    blocks.append(rng.choice(emitted))
+                    duplicates += 1
+                    continue
+
+                kind = rng.choice(KINDS)
+                variants[kind] = variants.get(kind, 0) + 1
+                block = section_html(rng, kind, variants[kind], images)
+                emitted.append(block)
+                blocks.append(block)
+
+            html = layout_html(name.title(), "\n".join(blocks), names)
+            zf.writestr(f"{root}/{name}.html", html)
+
+        zf.writestr(f"{root}/assets/css/style.css",
+                    "".join(f".{k}-section{{padding:40px 0}}\n" for k in KINDS))
+        zf.writestr(f"{root}/assets/js/main.js", "document.documentElement.classList.add('js');\n")
+        for image in images:
+            zf.writestr(f"{root}/{image}", png_bytes(rng, rng.choice([16, 64, 256])))
+
+    return {
+        "pages": pages,
+        "sections_per_page": sections,
+        "unique_sections": len(emitted),
+        "duplicate_sections": duplicates,
+        "assets": assets,
+        "seed": seed,
+        "bytes": path.stat().st_size,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic theme zip")
+    parser.add_argument("output")
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--sections", type=int, default=6)
+    parser.add_argument("--duplication", type=float, default=0.3)
+    parser.add_argument("--assets", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(make_theme(args.output, args.pages, args.sections,
+                     args.duplication, args.assets, args.seed))
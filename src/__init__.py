@@ -0,0 +1,5 @@
+from dotenv import load_dotenv
+
+# modules read their settings with os.getenv at import time, so .env has to
+# be loaded before the first of them is imported
+load_dotenv()
@@ -9,9 +9,14 @@ from langchain.messages import SystemMessage, HumanMessage
 from .logger import logger
 from langchain_nvidia_ai_endpoints import ChatNVIDIA
 from .track_expense import update_expense_log
+from .llm_cache import analysis_cache, cache_key
+from .retry import call_with_retry
+from .cassette import cassette_model
+from .compact_html import prepare_body, check_selectors
+from .shared_sections import merge_configs
 import shutil
+import json
 from .progress import push_log
-import time
 load_dotenv()
 
 OUTPUT_FOLDER = os.getenv("OUTPUT_FOLDER")
@@ -19,17 +24,18 @@ EXTRACT_FOLDER = os.getenv("EXTRACT_FOLDER")
 
 use = os.getenv("USE")
 model_name = os.getenv("MODEL_NAME")
+provider = "gemini" if use == "GEMINI" else "nvidia"
 if use == "GEMINI":
-    model = init_chat_model(
+    model = cassette_model(lambda: init_chat_model(
         model_name,
         max_tokens=31384,
-    )
+    ), f"analysis:{model_name}")
 else:
-    model = ChatNVIDIA(model=model_name,
+    model = cassette_model(lambda: ChatNVIDIA(model=model_name,
     temperature=0.3,
     top_p=0.95,
     max_completion_tokens=31384,
-    )   
+    ), f"analysis:{model_name}")
 with open("prompt/seperation.md", "r", encoding="utf-8") as f:
     prompt = f.read()
 
@@ -49,7 +55,7 @@ def extract_zip(zip_path, extract_to):
 
 
 
-def clean_html(html_path):
+def clean_html(html_path, shared=None):
     with open(html_path, "r", encoding="utf-8") as f:
         soup = BeautifulSoup(f.read(), "html.parser")
 
@@ -60,9 +66,29 @@ def clean_html(html_path):
     for script in body.find_all("script"):
         script.decompose()
 
-    return body.prettify()
+    if shared is not None:
+        removed = shared.strip(body)
+        logger.info(f"Stripped {removed} shared sections from {html_path}")
+        # nothing but shared chrome on this page
+        if not body.find(True):
+            return ""
+
+    return prepare_body(body, Path(html_path).name)
+
+
+def analyze_shared_html(html_code):
+    """Analyze the synthetic body holding every section shared across pages"""
+    body = BeautifulSoup(html_code, "html.parser").find("body")
+    push_log("Analyzing sections shared across pages...")
+    return html_to_json(prepare_body(body, "shared sections"), "shared_sections")
+
+def html_to_json(html_code,html_path=None,retries=4):
+    key = cache_key(html_code, prompt, model_name)
+    cached = analysis_cache.get(key)
+    if cached is not None:
+        logger.info(f"Analysis cache hit: {html_path}")
+        return cached
 
-def html_to_json(html_code,html_path=None,retries=3):
     messages = [
         SystemMessage(prompt),
         HumanMessage(f"""
@@ -73,32 +99,29 @@ def html_to_json(html_code,html_path=None,retries=3):
     ```
     """)
     ]
-    for attempt in range(1, retries + 1):
-        try:
-            response = model.invoke(messages)
+    def call():
+        response = model.invoke(messages)
 
-            usage = getattr(response, "usage_metadata", None)
-            if usage:
-                logger.info(f"Token Usage in analyzing HTML: {usage}")
-                update_expense_log(str(html_path), usage)
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            logger.info(f"Token Usage in analyzing HTML: {usage}")
+            update_expense_log(str(html_path), usage)
 
-            if response is None or not response.content:
-                raise ValueError("Empty response from model")
+        if response is None or not response.content:
+            raise ValueError("Empty response from model")
 
-            clean = re.sub(r"```json|```", "", response.content).strip()
-            return clean
+        clean = re.sub(r"```json|```", "", response.content).strip()
+        json.loads(clean)
+        return clean
 
-        except Exception as e:
-            logger.error(f"Attempt {attempt}/{retries} failed: {e}")
-            logger.info("Retrying in 60 seconds...")
-            time.sleep(60)
-
-    response = model.invoke(messages) 
-    clean = re.sub(r"```json|```", "", response.content).strip()
+    clean = call_with_retry(call, key=str(html_path), retries=retries,
+                            provider=provider, op="analysis")
+    analysis_cache.put(key, clean)
     return clean
 
 
-def process_html_file(html_path, project_name=None, extract_folder=None):
+def process_html_file(html_path, project_name=None, extract_folder=None,
+                      shared=None):
     """Process a single HTML file → JSON output"""
 
     output_dir = Path(OUTPUT_FOLDER) / project_name
@@ -117,14 +140,25 @@ def process_html_file(html_path, project_name=None, extract_folder=None):
         logger.info(f"Skipping (already exists): {output_path}")
         return output_path
 
-    html_code = clean_html(html_path)
+    html_code = clean_html(html_path, shared)
 
-    if not html_code:
+    if html_code is None or (not html_code and shared is None):
         logger.warning(f"No <body> found in {html_path}, skipping...")
         return None
 
     push_log(f"Analyzing HTML {html_path.stem}...")
-    json_output = html_to_json(html_code, html_path)
+    json_output = html_to_json(html_code, html_path) if html_code else "[]"
+
+    if shared is not None:
+        shared_config = shared.analyze(analyze_shared_html)
+        if shared_config is None:
+            logger.warning(f"Falling back to full-page analysis: {html_path}")
+            json_output = html_to_json(clean_html(html_path), html_path)
+        else:
+            merged = merge_configs(json.loads(json_output), shared_config, html_path)
+            json_output = json.dumps(merged, indent=2, ensure_ascii=False)
+
+    check_selectors(json_output, html_path)
 
     with open(output_path, "w", encoding="utf-8") as f:
         f.write(json_output)
@@ -133,8 +167,8 @@ def process_html_file(html_path, project_name=None, extract_folder=None):
     return output_path
 
 
-def process_zip_file(zip_path):
-    """Extract ZIP and process all HTML files"""
+def iter_zip_html_files(zip_path):
+    """Extract ZIP and yield every HTML file in it, without analyzing"""
 
     extract_folder = Path(EXTRACT_FOLDER) / zip_path.stem
     extract_zip(zip_path, extract_folder)
@@ -165,14 +199,46 @@ def process_zip_file(zip_path):
 
                 seen.add(rel_path)
 
-                output_path = process_html_file(
-                    full_path,
-                    project_name=zip_path.stem,
-                    extract_folder=extract_folder
-                )
+                yield full_path, extract_folder
+
+
+def process_zip_file(zip_path):
+    """Extract ZIP and process all HTML files"""
+
+    for full_path, extract_folder in iter_zip_html_files(zip_path):
+        output_path = process_html_file(
+            full_path,
+            project_name=zip_path.stem,
+            extract_folder=extract_folder
+        )
+
+        if output_path:
+            yield output_path,full_path,extract_folder
+
 
-                if output_path:
-                    yield output_path,full_path,extract_folder
+def iter_html_jobs(file_path):
+    """
+    Same inputs as seperate_html, but yields
+    (html_path, project_name, extract_folder) for every page
+    without calling the model, so analysis can run elsewhere.
+    """
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+
+    file_path = Path(file_path)
+
+    if not file_path.exists():
+        logger.warning("File not found.")
+        return
+
+    if file_path.suffix == ".zip":
+        for full_path, extract_folder in iter_zip_html_files(file_path):
+            yield full_path, file_path.stem, extract_folder
+
+    elif file_path.suffix == ".html":
+        yield file_path, file_path.stem, None
+    else:
+        logger.warning("Unsupported file type. Only .zip or .html allowed.")
+        return
           
 
 def seperate_html(file_path):
@@ -0,0 +1,151 @@
+import json
+import os
+import posixpath
+import re
+from pathlib import Path
+from .logger import logger
+
+# off by default: a reference the graph can't see means a missing file
+ASSET_PRUNE = os.getenv("ASSET_PRUNE", "0") == "1"
+
+# files of the converted theme whose asset references are roots of the graph
+TEMPLATE_EXTS = {".mustache", ".html", ".json"}
+
+# assets/css/x.css, {{ baseUrl }}/assets/..., /assets/... in templates and data
+TEMPLATE_REF = re.compile(r"""assets/([^"'()\s?#{}<>,;\\]+)""")
+CSS_URL = re.compile(r"""url\(\s*["']?([^"')]+?)["']?\s*\)""", re.IGNORECASE)
+CSS_IMPORT = re.compile(r"""@import\s+["']([^"']+)["']""", re.IGNORECASE)
+# quoted "img/bg.jpg"-like strings with any extension: JS sources,
+# data-background attributes; kept only if they name a manifest file
+QUOTED_PATH = re.compile(r"""["'`]([^"'`\s<>{}()]+\.[A-Za-z0-9]{1,12})(?:[?#][^"'`]*)?["'`]""")
+
+
+def _is_external(ref: str) -> bool:
+    return ref.startswith(("http:", "https:", "//", "data:", "#", "{{", "about:", "mailto:"))
+
+
+class AssetGraph:
+    """
+    Which manifest entries the converted theme actually reaches.
+
+    Roots are the asset paths named in the theme's templates (layouts,
+    partials, shortcodes) and data files: rewritten assets/ paths, inline
+    style url()s and quoted file names. Reachable CSS adds its url() and
+    @import targets, reachable JS the asset-looking string literals in it.
+    A reference that doesn't resolve to an exact path keeps every asset
+    with the same file name, so a mangled path costs bytes, not a broken
+    page.
+    """
+
+    def __init__(self, manifest: dict):
+        self.paths = {Path(dest).as_posix(): dest for dest in manifest}
+        self.manifest = manifest
+        self.by_name = {}
+        for path in self.paths:
+            self.by_name.setdefault(posixpath.basename(path).lower(), []).append(path)
+        self.reached = set()
+        self.unresolved = set()
+
+    def resolve(self, ref: str, base: str = "", quoted: bool = False) -> list:
+        """
+        Manifest paths ref may point to. quoted refs are any string literal
+        that looks like a file name, so only those with a directory count
+        as unresolved when nothing matches.
+        """
+        ref = ref.strip().split("?")[0].split("#")[0]
+        if not ref or _is_external(ref):
+            return []
+
+        candidates = [posixpath.normpath(posixpath.join(base, ref))]
+        if "assets/" in ref:
+            candidates.append(ref.split("assets/", 1)[1])
+        candidates.append(ref.lstrip("/"))
+        for candidate in candidates:
+            if candidate in self.paths:
+                return [candidate]
+
+        fallback = self.by_name.get(posixpath.basename(ref).lower(), [])
+        if not fallback and (not quoted or "/" in ref):
+            self.unresolved.add(ref)
+        return fallback
+
+    def references_in(self, path: str) -> list:
+        ext = posixpath.splitext(path)[1].lower()
+        if ext not in (".css", ".js"):
+            return []
+
+        src = self.manifest[self.paths[path]]["src"]
+        text = Path(src).read_text(encoding="utf-8", errors="ignore")
+        base = posixpath.dirname(path)
+        if ext == ".css":
+            refs = CSS_URL.findall(text) + CSS_IMPORT.findall(text)
+            return [p for ref in refs for p in self.resolve(ref, base)]
+        # scripts resolve URLs against the page, not the script
+        return [p for ref in QUOTED_PATH.findall(text) for p in self.resolve(ref, quoted=True)]
+
+    def walk(self, roots):
+        pending = list(roots)
+        while pending:
+            path = pending.pop()
+            if path in self.reached:
+                continue
+            self.reached.add(path)
+            pending.extend(self.references_in(path))
+        return self.reached
+
+
+def template_references(theme_dir: Path) -> list:
+    """Asset references in the converted theme's files, outside assets/: (paths, quoted strings)"""
+    refs, quoted = [], []
+    assets_dir = Path(theme_dir) / "assets"
+    for dirpath, dirnames, filenames in os.walk(theme_dir):
+        if Path(dirpath) == assets_dir:
+            dirnames.clear()
+            continue
+        for filename in filenames:
+            if Path(filename).suffix.lower() not in TEMPLATE_EXTS:
+                continue
+            text = (Path(dirpath) / filename).read_text(encoding="utf-8", errors="ignore")
+            refs.extend("assets/" + ref for ref in TEMPLATE_REF.findall(text))
+            refs.extend(CSS_URL.findall(text))
+            quoted.extend(QUOTED_PATH.findall(text))
+    return refs, quoted
+
+
+def prune_manifest(manifest: dict, theme_dir: Path, report_path: Path = None) -> dict:
+    """
+    Drop the manifest entries the theme in theme_dir never reaches, and
+    write what was pruned to report_path. Returns the kept entries.
+    """
+    graph = AssetGraph(manifest)
+    refs, quoted = template_references(theme_dir)
+    roots = [p for ref in refs for p in graph.resolve(ref)]
+    roots += [p for ref in quoted for p in graph.resolve(ref, quoted=True)]
+    reached = graph.walk(roots)
+
+    kept = {dest: entry for dest, entry in manifest.items()
+            if Path(dest).as_posix() in reached}
+    pruned = sorted(
+        (Path(dest).as_posix(), entry["size"]) for dest, entry in manifest.items()
+        if Path(dest).as_posix() not in reached
+    )
+    pruned_bytes = sum(size for _, size in pruned)
+
+    logger.info(
+        f"Asset graph: {len(kept)} of {len(manifest)} assets reachable, "
+        f"{len(pruned)} pruned ({pruned_bytes / 2**20:.1f} MiB), "
+        f"{len(graph.unresolved)} unresolved reference(s)"
+    )
+
+    if report_path:
+        report_path = Path(report_path)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        report_path.write_text(json.dumps({
+            "kept": len(kept),
+            "pruned": len(pruned),
+            "pruned_bytes": pruned_bytes,
+            "pruned_files": [{"path": path, "size": size} for path, size in pruned],
+            "unresolved": sorted(graph.unresolved),
+        }, indent=2), encoding="utf-8")
+
+    return kept
@@ -0,0 +1,163 @@
+import errno
+import hashlib
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from .logger import logger
+
+ASSET_EXTS = {
+    ".css", ".js",
+    ".png", ".jpg", ".jpeg", ".svg", ".webp", ".gif",
+    ".woff", ".woff2", ".ttf", ".eot"
+}
+
+# auto: hardlink, else reflink, else copy | reflink: reflink, else copy | copy
+ASSET_LINK_MODE = os.getenv("ASSET_LINK_MODE", "auto")
+ASSET_COPY_WORKERS = int(os.getenv("ASSET_COPY_WORKERS", "8"))
+
+FICLONE = 0x40049409  # linux/fs.h, btrfs/xfs/bcachefs copy-on-write clone
+
+
+def file_hash(path: Path, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _dest_for_top_file(name: str, ext: str) -> Path:
+    if ext == ".css":
+        return Path("css") / name
+    if ext == ".js":
+        return Path("js") / name
+    return Path("images") / name
+
+
+def build_manifest(theme_path: Path) -> dict:
+    """
+    Walk theme_path once and map every asset destination (relative to the
+    output assets folder) to its source, with size and content hash.
+
+    Same layout copy_assets always produced: a top-level folder that holds
+    any asset is copied whole (the contents of "assets" go to the root),
+    top-level asset files are sorted into css/, js/ and images/. Later
+    sources overwrite earlier ones, like the copies did.
+
+    Only files that share their size with another file are hashed; a
+    unique size already means unique content.
+    """
+    theme_path = Path(theme_path)
+    manifest = {}
+    top_files = []
+
+    for item in sorted(theme_path.iterdir()):
+        if item.is_file():
+            if item.suffix.lower() in ASSET_EXTS:
+                top_files.append(item)
+            continue
+        if not item.is_dir() or "doc" in item.name.lower():
+            continue
+
+        root = Path() if item.name.lower() == "assets" else Path(item.name)
+        files = []
+        has_assets = False
+        for dirpath, _, filenames in os.walk(item):
+            for filename in filenames:
+                src = Path(dirpath) / filename
+                files.append(src)
+                has_assets = has_assets or src.suffix.lower() in ASSET_EXTS
+
+        if not has_assets:
+            continue
+        logger.debug(f"Asset folder: {item.name}")
+
+        for src in files:
+            manifest[root / src.relative_to(item)] = {"src": src, "size": src.stat().st_size}
+
+    for src in top_files:
+        dest = _dest_for_top_file(src.name, src.suffix.lower())
+        manifest[dest] = {"src": src, "size": src.stat().st_size}
+
+    sizes = {}
+    for entry in manifest.values():
+        sizes[entry["size"]] = sizes.get(entry["size"], 0) + 1
+    candidates = [e for e in manifest.values() if sizes[e["size"]] > 1 and e["size"]]
+    with ThreadPoolExecutor(max_workers=ASSET_COPY_WORKERS) as pool:
+        for entry, digest in zip(candidates, pool.map(lambda e: file_hash(e["src"]), candidates)):
+            entry["hash"] = digest
+
+    return manifest
+
+
+def reflink(src: Path, dest: Path):
+    import fcntl
+    with open(src, "rb") as s, open(dest, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            dest.unlink()
+            raise
+    shutil.copystat(src, dest)
+
+
+def place_file(src: Path, dest: Path, mode: str = ASSET_LINK_MODE) -> str:
+    """Put src at dest as cheaply as the filesystem allows; returns how"""
+    if dest.exists() or dest.is_symlink():
+        dest.unlink()
+
+    if mode == "auto":
+        try:
+            os.link(src, dest)
+            return "hardlink"
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+    if mode in ("auto", "reflink") and os.name == "posix":
+        try:
+            reflink(src, dest)
+            return "reflink"
+        except (OSError, ImportError):
+            pass
+    shutil.copy2(src, dest)
+    return "copy"
+
+
+def copy_manifest(manifest: dict, assets_out: Path) -> dict:
+    """
+    Place every manifest entry under assets_out, in parallel. Files with
+    the same content are written once and the duplicates hardlinked to
+    that first copy.
+    """
+    assets_out = Path(assets_out)
+    first_by_hash = {}
+    unique, duplicates = [], []
+    for dest, entry in manifest.items():
+        digest = entry.get("hash")
+        if digest and digest in first_by_hash:
+            duplicates.append((first_by_hash[digest], assets_out / dest))
+            continue
+        if digest:
+            first_by_hash[digest] = assets_out / dest
+        unique.append((entry["src"], assets_out / dest))
+
+    for directory in {dest.parent for _, dest in unique + duplicates}:
+        directory.mkdir(parents=True, exist_ok=True)
+
+    stats = {"files": len(manifest), "duplicates": len(duplicates),
+             "bytes": sum(e["size"] for e in manifest.values())}
+    with ThreadPoolExecutor(max_workers=ASSET_COPY_WORKERS) as pool:
+        for how in pool.map(lambda job: place_file(*job), unique):
+            stats[how] = stats.get(how, 0) + 1
+        # linked from the first copies, inside the output tree, so on one filesystem
+        for how in pool.map(lambda job: place_file(*job), duplicates):
+            stats[how] = stats.get(how, 0) + 1
+
+    logger.info(
+        f"Assets: {stats['files']} files ({stats['bytes'] / 2**20:.1f} MiB), "
+        f"{stats['duplicates']} duplicates, "
+        + ", ".join(f"{stats[k]} {k}" for k in ("hardlink", "reflink", "copy") if k in stats)
+    )
+    return stats
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from playwright.async_api import async_playwright
+from playwright.async_api import Error as PlaywrightError
+from .logger import logger
+
+BROWSER_HEADLESS = os.getenv("BROWSER_HEADLESS", "1") == "1"
+# pages/contexts open at once across all jobs
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "4"))
+# cap on waiting for load + network idle + fonts, in seconds
+SCREENSHOT_READY_TIMEOUT = float(os.getenv("SCREENSHOT_READY_TIMEOUT", "5"))
+
+BROWSER_ARGS = ["--disable-gpu", "--disable-dev-shm-usage", "--no-first-run"]
+
+
+class BrowserPool:
+    """
+    One long-lived Chromium shared by every job in the process.
+
+    Jobs get a fresh context (cookies, storage, viewport) each, so they
+    stay isolated without paying for a browser launch. The browser is
+    started lazily and relaunched if it crashed. It only outlives its last
+    context on the loop that called keep_open() (the FastAPI app); any
+    other loop, e.g. each asyncio.run() of the CLI, closes it when idle,
+    since a browser left on a finished loop can't be closed any more.
+    """
+
+    def __init__(self, max_pages: int = BROWSER_MAX_PAGES):
+        self.max_pages = max_pages
+        self.playwright = None
+        self.browser = None
+        self.loop = None
+        self.lock = None
+        self.slots = None
+        self.active = 0
+        self.persistent_loop = None
+
+    def keep_open(self):
+        """Keep the browser between jobs on the running loop, until close()"""
+        self.persistent_loop = asyncio.get_running_loop()
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            if self.browser or self.playwright:
+                # only happens if a loop ended mid-job; its objects can't be awaited
+                logger.warning("Browser from a finished event loop was not closed")
+            self.playwright = self.browser = None
+            self.active = 0
+            self.loop = loop
+            self.lock = asyncio.Lock()
+            self.slots = asyncio.Semaphore(self.max_pages)
+
+    async def _ensure_browser(self):
+        async with self.lock:
+            if self.browser and self.browser.is_connected():
+                return self.browser
+
+            started = time.perf_counter()
+            if self.playwright is None:
+                self.playwright = await async_playwright().start()
+            self.browser = await self.playwright.chromium.launch(
+                headless=BROWSER_HEADLESS, args=BROWSER_ARGS
+            )
+            logger.info(f"Chromium launched in {time.perf_counter() - started:.2f}s")
+            return self.browser
+
+    @asynccontextmanager
+    async def context(self, **options):
+        """A fresh browser context; closed (with its pages) on exit"""
+        self._bind_loop()
+        # counted before launching, so an idle close can't pull it from under us
+        self.active += 1
+        try:
+            browser = await self._ensure_browser()
+            async with self.slots:
+                context = await browser.new_context(**options)
+                try:
+                    yield context
+                finally:
+                    try:
+                        await context.close()
+                    except PlaywrightError as e:
+                        logger.warning(f"Closing browser context failed: {e}")
+        finally:
+            self.active -= 1
+            if self.loop is not self.persistent_loop:
+                await self.close(idle_only=True)
+
+    async def close(self, idle_only: bool = False):
+        if self.loop is not asyncio.get_running_loop():
+            return
+        async with self.lock:
+            if idle_only and self.active:
+                return
+            browser, playwright = self.browser, self.playwright
+            self.browser = self.playwright = None
+            if browser:
+                await browser.close()
+            if playwright:
+                await playwright.stop()
+
+
+browser_pool = BrowserPool()
+
+
+async def open_when_ready(page, url: str, timeout: float = SCREENSHOT_READY_TIMEOUT):
+    """
+    Navigate, then wait for load, network idle and web fonts in turn,
+    timeout seconds in total. A slow CDN only costs the cap, it never
+    fails the screenshot.
+    """
+    deadline = time.monotonic() + timeout
+
+    def remaining_ms():
+        return max(1, (deadline - time.monotonic()) * 1000)
+
+    try:
+        await page.goto(url, wait_until="load", timeout=remaining_ms())
+        await page.wait_for_load_state("networkidle", timeout=remaining_ms())
+        await page.wait_for_function("document.fonts.status === 'loaded'",
+                                     timeout=remaining_ms())
+    except PlaywrightError as e:
+        logger.info(f"Page not idle after {timeout}s, capturing anyway: {url} ({e.message.splitlines()[0]})")
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from .logger import logger
+
+CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "off").lower()
+CASSETTE_DIR = Path(os.getenv("LLM_CASSETTE_DIR", "cassettes/default"))
+# 0 replays instantly, 1 sleeps for the recorded latency
+CASSETTE_LATENCY_SCALE = float(os.getenv("LLM_CASSETTE_LATENCY_SCALE", "0"))
+
+
+class CassetteMiss(LookupError):
+    """Replay mode and no recording for this request"""
+    # treated like a 4xx by the retry layer: never retried
+    status_code = 404
+
+
+class _UsageRecorder(BaseCallbackHandler):
+    def __init__(self):
+        self.usage = None
+
+    def on_llm_end(self, response: LLMResult, **kwargs):
+        try:
+            message = response.generations[0][0].message
+            if message.usage_metadata:
+                self.usage = dict(message.usage_metadata)
+                return
+        except (IndexError, AttributeError):
+            pass
+
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        if token_usage:
+            self.usage = {
+                "input_tokens": token_usage.get("prompt_tokens", 0),
+                "output_tokens": token_usage.get("completion_tokens", 0),
+                "total_tokens": token_usage.get("total_tokens", 0),
+            }
+
+
+def _replay_usage(usage: dict):
+    """Feed recorded usage to an active get_openai_callback(), if any"""
+    if not usage:
+        return
+    try:
+        from langchain_community.callbacks.manager import openai_callback_var
+    except ImportError:
+        return
+
+    handler = openai_callback_var.get()
+    if handler is None:
+        return
+
+    message = AIMessage(content="", usage_metadata=usage)
+    handler.on_llm_end(LLMResult(generations=[[ChatGeneration(message=message)]]))
+
+
+def _message_dict(message) -> dict:
+    return {
+        "type": getattr(message, "type", type(message).__name__),
+        "content": getattr(message, "content", str(message)),
+    }
+
+
+def request_key(model_id: str, messages) -> str:
+    payload = json.dumps(
+        {"model": model_id, "messages": [_message_dict(m) for m in messages]},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _dump_response(response) -> dict:
+    if hasattr(response, "model_dump") and not isinstance(response, AIMessage):
+        return {"type": "structured", "data": response.model_dump()}
+
+    return {
+        "type": "ai",
+        "content": response.content,
+        "usage_metadata": dict(response.usage_metadata or {}),
+        "response_metadata": dict(response.response_metadata or {}),
+    }
+
+
+def _load_response(data: dict, schema):
+    if data["type"] == "structured":
+        return schema.model_validate(data["data"]) if schema else data["data"]
+
+    return AIMessage(
+        content=data["content"],
+        usage_metadata=data.get("usage_metadata") or None,
+        response_metadata=data.get("response_metadata") or {},
+    )
+
+
+class CassetteModel:
+    """
+    Stand-in for a chat model (or its with_structured_output runnable) that
+    records every invoke() to LLM_CASSETTE_DIR, or replays it from there.
+
+    In replay mode the real client is never constructed, so a whole theme
+    conversion runs offline. Requests are keyed by a hash of the model id,
+    output schema and messages.
+    """
+
+    def __init__(self, factory, model_id: str, schema=None, inner=None):
+        self.factory = factory
+        self.model_id = model_id
+        self.schema = schema
+        self._inner = inner
+
+    @property
+    def inner(self):
+        if self._inner is None:
+            self._inner = self.factory()
+        return self._inner
+
+    def with_structured_output(self, schema, **kwargs):
+        if CASSETTE_MODE == "replay":
+            inner = None
+            factory = None
+        else:
+            inner = self.inner.with_structured_output(schema, **kwargs)
+            factory = lambda: inner
+        return CassetteModel(factory, f"{self.model_id}:{schema.__name__}", schema, inner)
+
+    def _path(self, key: str) -> Path:
+        return CASSETTE_DIR / f"{key}.json"
+
+    def invoke(self, messages, config=None, **kwargs):
+        key = request_key(self.model_id, messages)
+
+        if CASSETTE_MODE == "replay":
+            path = self._path(key)
+            if not path.exists():
+                raise CassetteMiss(f"No cassette recording for {self.model_id} ({key[:12]})")
+
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            if CASSETTE_LATENCY_SCALE > 0:
+                time.sleep(entry.get("latency", 0) * CASSETTE_LATENCY_SCALE)
+
+            _replay_usage(entry.get("usage"))
+            return _load_response(entry["response"], self.schema)
+
+        recorder = _UsageRecorder()
+        config = dict(config or {})
+        config["callbacks"] = list(config.get("callbacks") or []) + [recorder]
+
+        started = time.monotonic()
+        response = self.inner.invoke(messages, config=config, **kwargs)
+        latency = time.monotonic() - started
+
+        if response is not None:
+            entry = {
+                "model": self.model_id,
+                "latency": latency,
+                "usage": recorder.usage or getattr(response, "usage_metadata", None),
+                "request": str(getattr(messages[-1], "content", ""))[:200],
+                "response": _dump_response(response),
+            }
+            CASSETTE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp_file = self._path(key).with_suffix(".tmp")
+            tmp_file.write_text(json.dumps(entry, ensure_ascii=False, indent=2), encoding="utf-8")
+            tmp_file.replace(self._path(key))
+
+        return response
+
+    def batch(self, inputs, config=None, **kwargs):
+        return [self.invoke(messages, config=config, **kwargs) for messages in inputs]
+
+
+def cassette_model(factory, model_id: str):
+    """Build the chat model through factory(), wrapped for record/replay if enabled"""
+    if CASSETTE_MODE not in ("record", "replay"):
+        return factory()
+
+    logger.info(f"LLM cassette {CASSETTE_MODE}: {model_id} -> {CASSETTE_DIR}")
+    return CassetteModel(factory, model_id)
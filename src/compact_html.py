@@ -0,0 +1,111 @@
+import json
+import os
+import re
+from bs4 import BeautifulSoup, Comment, NavigableString
+from .logger import logger
+
+COMPACT_HTML = os.getenv("COMPACT_HTML", "1") == "1"
+COMPACT_MAX_TEXT = int(os.getenv("COMPACT_MAX_TEXT", "80"))
+COMPACT_KEEP_ATTRS = {
+    a.strip() for a in os.getenv("COMPACT_KEEP_ATTRS", "id,class,role").split(",")
+    if a.strip()
+}
+
+# never useful for picking a section selector
+DROP_TAGS = ["style", "link", "meta", "source", "track", "noscript"]
+# keep the element (it can carry an id/class) but drop what is inside it
+HOLLOW_TAGS = ["svg", "canvas", "iframe", "video", "audio", "object", "select"]
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1 if text else 0
+
+
+def compact_body(body, max_text=COMPACT_MAX_TEXT, keep_attrs=COMPACT_KEEP_ATTRS):
+    """
+    Shrink a <body> for page analysis without touching anything a selector
+    can depend on: every element and its id/class (plus keep_attrs) stays,
+    while comments, inline SVG/media contents, srcset/style/data-* and other
+    attributes go, text is whitespace-collapsed and cut to max_text chars.
+    Returns the compacted HTML without prettify() indentation.
+    """
+    for comment in body.find_all(string=lambda t: isinstance(t, Comment)):
+        comment.extract()
+
+    for tag in body.find_all(DROP_TAGS):
+        tag.decompose()
+
+    for tag in body.find_all(HOLLOW_TAGS):
+        tag.clear()
+
+    for tag in body.find_all(True):
+        if tag.attrs:
+            tag.attrs = {k: v for k, v in tag.attrs.items() if k in keep_attrs}
+
+    for text in body.find_all(string=True):
+        if not isinstance(text, NavigableString) or isinstance(text, Comment):
+            continue
+
+        collapsed = re.sub(r"\s+", " ", text)
+        if not collapsed.strip():
+            text.extract()
+            continue
+
+        if max_text and len(collapsed) > max_text:
+            collapsed = collapsed[:max_text].rstrip() + "…"
+
+        if collapsed != text:
+            text.replace_with(collapsed)
+
+    return body.decode(formatter="minimal")
+
+
+def prepare_body(body, name=""):
+    """Body HTML sent for analysis, compacted unless COMPACT_HTML=0"""
+    pretty = body.prettify()
+    if not COMPACT_HTML:
+        return pretty
+
+    compacted = compact_body(body)
+
+    before = estimate_tokens(pretty)
+    after = estimate_tokens(compacted)
+    saved = (1 - after / before) * 100 if before else 0
+    logger.info(
+        f"HTML compaction {name}: ~{before} -> ~{after} tokens ({saved:.0f}% saved)"
+    )
+
+    return compacted
+
+
+def check_selectors(json_output: str, html_path) -> list:
+    """Selectors from the analysis that do not resolve against the original page"""
+    try:
+        configs = json.loads(json_output)
+    except json.JSONDecodeError:
+        logger.warning(f"Analysis for {html_path} is not valid JSON")
+        return []
+
+    with open(html_path, "r", encoding="utf-8") as f:
+        soup = BeautifulSoup(f.read(), "html.parser")
+
+    missing = []
+    for config in configs if isinstance(configs, list) else []:
+        selector = config.get("selector") if isinstance(config, dict) else None
+        if not selector:
+            continue
+
+        try:
+            found = soup.select_one(selector)
+        except Exception:
+            found = None
+
+        if found is None:
+            missing.append(selector)
+
+    if missing:
+        logger.warning(
+            f"{len(missing)} selectors do not resolve in {html_path}: {missing}"
+        )
+
+    return missing
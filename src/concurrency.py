@@ -0,0 +1,167 @@
+import os
+import time
+from threading import Condition, Lock
+from .logger import logger
+
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "4"))
+LLM_LATENCY_SPIKE = float(os.getenv("LLM_LATENCY_SPIKE", "3"))
+
+OK = "ok"
+CONGESTED = "congested"
+NEUTRAL = "neutral"
+
+# latency samples before spikes are trusted
+WARMUP_SAMPLES = 5
+
+
+class AIMDLimiter:
+    """
+    Adaptive limit on in-flight requests to one provider.
+
+    Every healthy response raises the limit by 1/limit (about +1 per full
+    window of requests); a 429, timeout, 5xx or a latency spike above
+    LLM_LATENCY_SPIKE x the moving average halves it, at most once per
+    average round trip so one burst of failures only counts once.
+
+    Calls abandoned on timeout keep their slot until they really return,
+    but only up to half the limit: past that they stop counting, so a few
+    hung requests can't block every later call.
+    """
+
+    def __init__(self, name: str,
+                 initial=LLM_INITIAL_CONCURRENCY,
+                 minimum=LLM_MIN_CONCURRENCY,
+                 maximum=LLM_MAX_CONCURRENCY):
+        self.name = name
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.inflight = 0
+        self.abandoned = 0
+        self.cond = Condition()
+        self.latency = None
+        self.samples = 0
+        self.last_decrease = 0.0
+
+    def _full(self) -> bool:
+        uncounted = max(0, self.abandoned - int(self.limit) // 2)
+        return self.inflight - uncounted >= int(self.limit)
+
+    def acquire(self, timeout: float = None, check=None) -> float:
+        """
+        Wait for a slot, at most timeout seconds (TimeoutError after that).
+        check(), if given, runs whenever the wait wakes up (see wake()) and
+        may raise to give up, e.g. when the provider's circuit opened.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while self._full():
+                if check:
+                    check()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"[{self.name}] no free slot within {timeout:g}s")
+                self.cond.wait(remaining)
+            self.inflight += 1
+        return time.monotonic()
+
+    def try_acquire(self):
+        """Like acquire() but returns None instead of waiting for a slot"""
+        with self.cond:
+            if self._full():
+                return None
+            self.inflight += 1
+        return time.monotonic()
+
+    def release(self, started: float, outcome: str = OK, until=None):
+        """
+        Report the outcome of a call and free its slot. With until (the
+        future still running an abandoned call), the outcome counts now
+        but the slot stays taken until that call really returns.
+        """
+        latency = time.monotonic() - started
+
+        with self.cond:
+            if until is None:
+                self.inflight -= 1
+            else:
+                self.abandoned += 1
+
+            if outcome == OK:
+                self._on_success(latency)
+            elif outcome == CONGESTED:
+                self._decrease("error")
+
+            self.cond.notify_all()
+
+        if until is not None:
+            until.add_done_callback(lambda f: self._free())
+
+    def _free(self):
+        with self.cond:
+            self.inflight -= 1
+            self.abandoned -= 1
+            self.cond.notify_all()
+
+    def wake(self):
+        """Wake every acquire() so its check() runs now"""
+        with self.cond:
+            self.cond.notify_all()
+
+    def _on_success(self, latency: float):
+        spike = (
+            self.samples >= WARMUP_SAMPLES
+            and latency > LLM_LATENCY_SPIKE * self.latency
+        )
+
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = 0.8 * self.latency + 0.2 * latency
+        self.samples += 1
+
+        if spike:
+            self._decrease(f"latency {latency:.1f}s")
+            return
+
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def _decrease(self, reason: str):
+        now = time.monotonic()
+        if now - self.last_decrease < max(1.0, self.latency or 1.0):
+            return
+
+        self.last_decrease = now
+        old = self.limit
+        self.limit = max(self.minimum, self.limit / 2)
+        logger.info(
+            f"[{self.name}] concurrency {int(old)} -> {int(self.limit)} ({reason})"
+        )
+
+    def stats(self) -> dict:
+        with self.cond:
+            return {
+                "limit": int(self.limit),
+                "inflight": self.inflight,
+                "abandoned": self.abandoned,
+                "latency": self.latency,
+            }
+
+
+_limiters = {}
+_limiters_lock = Lock()
+
+
+def get_limiter(provider: str) -> AIMDLimiter:
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = AIMDLimiter(provider)
+        return _limiters[provider]
+
+
+def limiter_stats() -> dict:
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {provider: limiter.stats() for provider, limiter in limiters.items()}
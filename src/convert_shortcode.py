@@ -11,139 +11,305 @@ from .track_expense import update_expense_log
 from .save_shortcode import (
     is_already_processed,
     mark_as_processed,
-    skeleton_hash
+    fingerprint
 )
-from src.schema import ShortcodeSchema
+from src.schema import ShortcodeSchema, ShortcodeBatchSchema
+from .journal import JsonlJournal
+from .cassette import cassette_model
+from .scheduler import LLMScheduler
+from concurrent.futures import as_completed
 
 from langchain_community.callbacks import get_openai_callback
 
 load_dotenv()
 model_name = os.getenv("MODEL_NAME")
-batch_size=7
-model = ChatNVIDIA(model=model_name,
+# upper bound only, the provider's AIMD limiter decides how many really run
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "16"))
+# token budget of component data packed into one request, 0 disables packing
+PACK_TOKEN_BUDGET = int(os.getenv("SHORTCODE_PACK_TOKENS", "3000"))
+PACK_MAX_ITEMS = int(os.getenv("SHORTCODE_PACK_MAX_ITEMS", "6"))
+model = cassette_model(lambda: ChatNVIDIA(model=model_name,
     max_completion_tokens=31384,
     temperature=0.4,
     top_p=0.95,
 
-)
+), f"shortcode:{model_name}")
 structured_model = model.with_structured_output(ShortcodeSchema)
+packed_model = model.with_structured_output(ShortcodeBatchSchema)
+shortcode_scheduler = LLMScheduler(LLM_MAX_INFLIGHT, name="shortcode")
+
+with open("prompt/shortcode-pack.md", "r", encoding="utf-8") as f:
+    pack_prompt = f.read()
 
 def clean_llm_json(response_text: str):
     cleaned = re.sub(r"```json|```", "", response_text).strip()
     return json.loads(cleaned)
 
-import time
 from .progress import push_log
+from .retry import call_with_retry
+from .tracing import span
 
-def invoke_with_retry(model, messages, key, retries=5):
-    last_error = None
+def save_bad_output(name: str, content: str):
+    try:
+        Path("temp/bad_outputs").mkdir(parents=True, exist_ok=True)
+        Path(f"temp/bad_outputs/{name}.txt").write_text(content, encoding="utf-8")
+    except OSError:
+        pass
 
-    for attempt in range(1, retries + 1):
-        try:
-            with get_openai_callback() as cb:
-                response = model.invoke(messages)
 
-            logger.info(f"Input tokens: {cb.prompt_tokens}")
-            logger.info(f"Output tokens: {cb.completion_tokens}")
-            logger.info(f"Total tokens: {cb.total_tokens}")
+def invoke_with_retry(model, messages, key, retries=5, op="shortcode"):
 
-            usage = {
-                "input_tokens": cb.prompt_tokens,
-                "output_tokens": cb.completion_tokens,
-                "total_tokens": cb.total_tokens
-            }
+    def call():
+        with get_openai_callback() as cb:
+            response = model.invoke(messages)
 
-            logger.info(f"Token Usage: {usage}")
-            update_expense_log(key, usage)
+        logger.info(f"Input tokens: {cb.prompt_tokens}")
+        logger.info(f"Output tokens: {cb.completion_tokens}")
+        logger.info(f"Total tokens: {cb.total_tokens}")
 
+        usage = {
+            "input_tokens": cb.prompt_tokens,
+            "output_tokens": cb.completion_tokens,
+            "total_tokens": cb.total_tokens
+        }
 
-            if response is None:
-                raise ValueError("LLM returned None")
+        logger.info(f"Token Usage: {usage}")
+        update_expense_log(key, usage)
 
 
-            cleaned = response.model_dump()
-            return cleaned
+        if response is None:
+            raise ValueError("LLM returned None")
 
-        except Exception as e:
-            last_error = e
-            logger.error(f"Attempt {attempt}/{retries} failed for {key}: {e}")
 
+        cleaned = response.model_dump()
+        return cleaned
 
-            try:
-                Path("temp/bad_outputs").mkdir(exist_ok=True)
-                Path(f"temp/bad_outputs/error_attempt_{attempt}.txt").write_text(
-                    str(response) if "response" in locals() else str(e),
-                    encoding="utf-8"
-                )
-            except:
-                pass
+    return call_with_retry(
+        call,
+        key=key,
+        retries=retries,
+        on_error=lambda e, attempt: save_bad_output(f"{key}_attempt_{attempt}", str(e)),
+        op=op
+    )
 
-            time.sleep(60)
 
+def component_key(component_dict: dict) -> str:
+    """Journal key of a component: its fingerprint, the LLM-given name is not unique"""
+    return fingerprint(component_dict["html"])[1]
 
-    raise last_error
 
+def load_checkpoint(output_dir: Path, components: list):
+    """
+    Per-page result journal (shortcodes.jsonl) and the records already in it.
+    A shortcodes.json left by an older run seeds the journal once; its
+    entries only carry names, so a name shared by several of the page's
+    components is regenerated.
+    """
+    journal = JsonlJournal(output_dir / "shortcodes.jsonl", key=lambda r: r["key"])
+    records = journal.read()
 
-def batch_invoke_with_retry(model, messages, keys, retries=5,batch_name=""):
-    results = [None] * len(messages)
-    pending = list(range(len(messages)))
+    legacy_file = output_dir / "shortcodes.json"
+    if not records and legacy_file.exists():
+        with open(legacy_file, "r", encoding="utf-8") as f:
+            legacy = json.load(f)
+        keys_by_name = {}
+        for comp in components:
+            keys_by_name.setdefault(comp["name"], []).append(component_key(comp))
+        for comp in legacy:
+            keys = keys_by_name.get(comp["name"], [])
+            if len(keys) != 1:
+                continue
+            record = {"key": keys[0], "name": comp["name"], "shortcode": comp}
+            journal.append(record)
+            records.append(record)
 
-    for attempt in range(1, retries + 1):
-        if not pending:
-            break
+    return journal, records
 
-        logger.info(f"Batch attempt {attempt}/{retries} → {len(pending)} left")
 
-        try:
-            pending_inputs = [messages[i] for i in pending]
-            pending_keys = [keys[i] for i in pending]
+def materialize_checkpoint(journal: JsonlJournal, output_file: Path, order=None):
+    """
+    Write the journal out as the final shortcodes.json, once per page. With
+    order (the page's component keys) only those records are kept, in it.
+    """
+    records = journal.read()
+    journal.close()
 
-            with get_openai_callback() as cb:
-                responses = model.batch(pending_inputs)
+    if order:
+        position = {key: i for i, key in enumerate(order)}
+        records = sorted((r for r in records if r["key"] in position),
+                         key=lambda r: position[r["key"]])
+    final_output = [r["shortcode"] for r in records]
 
+    tmp_file = output_file.with_suffix(".tmp")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(final_output, f, indent=2, ensure_ascii=False)
+    tmp_file.replace(output_file)
 
-            usage = {
-                "input_tokens": cb.prompt_tokens,
-                "output_tokens": cb.completion_tokens,
-                "total_tokens": cb.total_tokens,
-            }
+    return final_output
 
-            logger.info(f"Batch Token Usage: {usage}")
 
+def save_component(journal: JsonlJournal, name: str, html: str, shortcode: dict):
+    """Checkpoint one generated component and mark it processed"""
+    journal.append({"key": fingerprint(html)[1], "name": name, "shortcode": shortcode})
+    mark_as_processed(name, html, shortcode)
 
-            update_expense_log(batch_name, usage)
 
-            for idx, key, resp in zip(pending, pending_keys, responses):
-                
-                try:
-                    if resp is None:
-                        raise ValueError("LLM returned None")
-                    
-                    results[idx] = resp.model_dump()
-
-                except Exception as e:
-                    logger.error(
-            f"Batch attempt {attempt}/{retries} failed for {key}: {e}")
-                    Path("temp/bad_outputs").mkdir(exist_ok=True)
-                    (
-                    Path(f"temp/bad_outputs/{key}_attempt_{attempt}.txt")
-                    .write_text(
-                        str(resp),
-                        encoding="utf-8"
-                    ))
-            pending = [i for i in range(len(messages)) if results[i] is None]
+def generate_component(messages, key: str, html: str,
+                       journal: JsonlJournal, expense_key: str):
+    """Generate, checkpoint and mark a single component"""
+    cleaned = invoke_with_retry(structured_model, messages, expense_key, retries=5)
+
+    save_component(journal, key, html, cleaned)
+    return {key: cleaned}
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def component_message(system_msg, component_dict):
+    return [
+        system_msg,
+        HumanMessage(
+            f"""
+            Component Key: {component_dict["name"]}
+
+            Component Data:
+            {json.dumps(component_dict, indent=2)}
+            """
+        )
+    ]
+
+
+def plan_packs(components: list) -> list:
+    """
+    Group small components (first-fit, largest first) so that each group's
+    component data stays under PACK_TOKEN_BUDGET. Components that are too
+    big to share a request end up in a group of their own.
+    """
+    if PACK_TOKEN_BUDGET <= 0 or PACK_MAX_ITEMS <= 1:
+        return [[c] for c in components]
+
+    sized = sorted(
+        ((estimate_tokens(json.dumps(c)), c) for c in components),
+        key=lambda x: x[0],
+        reverse=True
+    )
+
+    packs = []
+    for tokens, comp in sized:
+        for pack in packs:
+            if (pack["tokens"] + tokens <= PACK_TOKEN_BUDGET
+                    and len(pack["items"]) < PACK_MAX_ITEMS):
+                pack["items"].append(comp)
+                pack["tokens"] += tokens
+                break
+        else:
+            packs.append({"tokens": tokens, "items": [comp]})
+
+    return [pack["items"] for pack in packs]
+
+
+def split_pack_results(components: list, results: list) -> list:
+    """
+    The packed result of each component, in order, matched by name only.
+    None where the name is missing from the results, returned twice or
+    shared by two components of the pack: those go through single calls.
+    """
+    names = [c["name"] for c in components]
+    by_name = {}
+    for r in results:
+        if isinstance(r, dict):
+            by_name.setdefault(r.get("name"), []).append(r)
+
+    return [
+        by_name[name][0]
+        if names.count(name) == 1 and len(by_name.get(name, [])) == 1 else None
+        for name in names
+    ]
+
+
+def generate_pack(system_msg, components: list,
+                  journal: JsonlJournal, folder_name: str, batch: int = 0):
+    """
+    One scheduler job for several small components sharing one request,
+    so the shortcode system prompt is sent once instead of per component.
+    Anything the packed call fails to return falls back to single calls.
+    """
+    with span("shortcode.batch", "batch", page=folder_name, batch=batch,
+              components=len(components)):
+        return _generate_pack(system_msg, components, journal, folder_name)
+
+
+def _generate_pack(system_msg, components: list,
+                   journal: JsonlJournal, folder_name: str):
+    todo = []
+    done = {}
+    for comp in components:
+        # another page may have produced a matching block while this one was
+        # queued; the queue-time lookup was already counted
+        exists, match, score = is_already_processed(comp["html"], record=False)
+        if exists:
+            logger.info(
+                f"Skipping {comp['name']}[Processed while queued:{match['name']}]: {score}"
+            )
+            done[comp["name"]] = None
+        else:
+            todo.append(comp)
+
+    if len(todo) == 1:
+        comp = todo[0]
+        done.update(generate_component(
+            component_message(system_msg, comp), comp["name"], comp["html"],
+            journal, f"{folder_name}_{comp['name']}"
+        ))
+        return done
+
+    results = [None] * len(todo)
+    if todo:
+        body = "\n\n---\n\n".join(
+            f"""
+            Component Key: {comp["name"]}
+
+            Component Data:
+            {json.dumps(comp, indent=2)}
+            """
+            for comp in todo
+        )
+        messages = [system_msg, HumanMessage(f"{pack_prompt}\n\n{body}")]
+        pack_key = f"{folder_name}_pack_" + "+".join(c["name"] for c in todo)
+
+        try:
+            packed = invoke_with_retry(packed_model, messages, pack_key,
+                                       retries=1, op="shortcode_pack")
+            results = split_pack_results(todo, packed.get("shortcodes", []))
+            matched = sum(r is not None for r in results)
+            logger.info(f"Packed call returned {matched}/{len(todo)} components")
         except Exception as e:
-            logger.error(f"Batch attempt {attempt}/{retries} failed: {e}")
-            logger.info("Retrying in 60 seconds...")
-            time.sleep(60+(attempt*2))   
-        
-    failed = [keys[i] for i,r in enumerate(results) if r is None]
-    if failed :
-        raise RuntimeError(f"Batch failed completely: {failed}")
-    
-    return results
+            logger.warning(f"Packed call failed, falling back to single calls: {e}")
 
-def generate_shortcodes_batch(input_json_file: str,theme_name: str):
+    for comp, cleaned in zip(todo, results):
+        key = comp["name"]
+
+        if cleaned is None:
+            done.update(generate_component(
+                component_message(system_msg, comp), key, comp["html"],
+                journal, f"{folder_name}_{key}"
+            ))
+            continue
+
+        save_component(journal, key, comp["html"], cleaned)
+        done[key] = cleaned
+
+    return done
+
+
+def queue_shortcodes(input_json_file: str, theme_name: str) -> dict:
+    """
+    Submit every new component of one page to the shortcode scheduler and
+    return without waiting, so all pages feed the scheduler at once. The
+    returned page state is handed to finish_shortcodes.
+    """
     with open("prompt/shortcode-creation.md", "r", encoding="utf-8") as f:
         shortcode_prompt = f.read()
 
@@ -165,28 +331,22 @@ def generate_shortcodes_batch(input_json_file: str,theme_name: str):
     logger.info(f"Loaded shortcodes type: {type(shortcodes)}")
 
 
-    final_output = []
-    already_done = set()
-
-    if output_file.exists():
-        with open(output_file, "r", encoding="utf-8") as f:
-            final_output = json.load(f)
-        already_done = {c["name"] for c in final_output}
-        logger.info(f"Resuming: {len(final_output)} already done")
+    journal, done_records = load_checkpoint(output_dir, shortcodes)
+    already_done = {r["key"] for r in done_records}
+    if already_done:
+        logger.info(f"Resuming: {len(already_done)} already done")
     
     seen_html = set()
-    batch = []
-    batch_inputs = []
-    batch_keys=[]
+    queued = []
+    futures = {}
 
     push_log(f"Generating shortcodes for {input_path.parent.name}")
-    logger.info("Starting batch shortcode generation...\n")
-    batch_no = 1
+    logger.info("Queueing components for shortcode generation...\n")
     for component_dict in shortcodes:
         key = component_dict["name"]
         html = component_dict["html"]
 
-        if key in already_done:
+        if component_key(component_dict) in already_done:
             continue
 
         exits,match,score = is_already_processed(html)
@@ -196,84 +356,73 @@ def generate_shortcodes_batch(input_json_file: str,theme_name: str):
             )
             continue
 
-        hash_html = skeleton_hash(html)
+        _, hash_html = fingerprint(html)
         if hash_html in seen_html:
             logger.info(f"Skipping {key}[Duplicate]")
             continue
 
         seen_html.add(hash_html)
+        queued.append(component_dict)
 
-
-        message = [
+    for batch, pack in enumerate(plan_packs(queued)):
+        future = shortcode_scheduler.submit(
+            generate_pack,
             system_msg,
-            HumanMessage(
-                f"""
-                Component Key: {key}
-
-                Component Data:
-                {json.dumps(component_dict, indent=2)}
-                """
-            )
-        ]
-
-        batch.append(component_dict)
-        batch_inputs.append(message)
-        batch_keys.append(key)
-        
-        if len(batch) == batch_size:
-            batch_results = batch_invoke_with_retry(
-                structured_model,
-                batch_inputs,
-                batch_keys,
-                retries=5,
-                batch_name=f"{folder_name}_batch_{batch_no}"
-            )
-            logger.info(f"Got response batch: {len(batch_results)}/{len(batch)}")
-
-            for comp,cleaned in zip(batch,batch_results):
-                key = comp["name"]
-                html = comp["html"]
-
-                final_output.append(cleaned)
-                mark_as_processed(key,html,cleaned)
-                already_done.add(key)
-                with open(output_file,'w',encoding="utf-8") as f:
-                    json.dump(final_output,f,indent=2,ensure_ascii=False)
-
-                logger.info(f"Saved: {key}")
-
-            batch = []
-            batch_inputs = []
-            batch_keys=[]
-            batch_no += 1   
-        
-    if batch:
-        logger.info(f"Processing leftovers: {len(batch)}")
-        batch_results = batch_invoke_with_retry(
-            structured_model,
-            batch_inputs,
-            batch_keys,
-            retries=5,
-            batch_name=f"{folder_name}_batch_{batch_no}"
+            pack,
+            journal,
+            folder_name,
+            batch=batch,
+            priority=sum(len(c["html"]) for c in pack)
         )
+        futures[future] = [c["name"] for c in pack]
+
+    logger.info(
+        f"Queued {len(queued)} components from {folder_name} "
+        f"in {len(futures)} requests"
+    )
+
+    return {
+        "folder_name": folder_name,
+        "journal": journal,
+        "futures": futures,
+        "output_file": output_file,
+        "order": [component_key(c) for c in shortcodes],
+    }
+
+
+def finish_shortcodes(queued: dict) -> Path:
+    """Wait for a page queued by queue_shortcodes and write its shortcodes.json"""
+    journal = queued["journal"]
+    futures = queued["futures"]
+    output_file = queued["output_file"]
+
+    errors = []
+    for future in as_completed(futures):
+        keys = futures[future]
+        try:
+            results = future.result()
+        except Exception as e:
+            logger.error(f"Shortcode generation failed for {keys}: {e}")
+            errors.extend(keys)
+            continue
 
-        for comp, cleaned in zip(batch, batch_results):
-
-            key = comp["name"]
-            html = comp["html"]
-
-            final_output.append(cleaned)
-            mark_as_processed(key,html,cleaned)
-            already_done.add(key)
-            with open(output_file, 'w', encoding="utf-8") as f:
-                json.dump(final_output, f, indent=2, ensure_ascii=False)
+        for key, cleaned in results.items():
+            if cleaned is not None:
+                logger.info(f"Saved: {key}")
 
-            logger.info(f"Saved: {key}")
+    if errors:
+        journal.close()
+        raise RuntimeError(f"Shortcode generation failed for: {errors}")
 
+    materialize_checkpoint(journal, output_file, queued["order"])
     logger.info(f"\nAll done. Output saved at: {output_file}")
     return output_file
 
 
+def generate_shortcodes_batch(input_json_file: str, theme_name: str):
+    return finish_shortcodes(queue_shortcodes(input_json_file, theme_name))
+
+
 
 
 
@@ -302,17 +451,11 @@ def generate_shortcodes(input_json_file: str,theme_name: str):
 
 
 
-    if output_file.exists():
-        with open(output_file, "r", encoding="utf-8") as f:
-            final_output = json.load(f)
-        logger.info(f"Resuming from existing file: {len(final_output)} items loaded")
-    else:
-        final_output = []
+    journal, done_records = load_checkpoint(output_dir, shortcodes)
+    if done_records:
+        logger.info(f"Resuming from existing file: {len(done_records)} items loaded")
     system_msg = SystemMessage(shortcode_prompt)
-    if len(final_output) > 0:
-        already_done = {item["name"] for item in final_output}
-    else:
-        already_done = set()
+    already_done = {r["key"] for r in done_records}
 
 
     logger.info("Generating shortcodes one by one...")
@@ -320,7 +463,7 @@ def generate_shortcodes(input_json_file: str,theme_name: str):
         key = component_dict["name"]
         html = component_dict["html"]
         
-        if key in already_done:
+        if component_key(component_dict) in already_done:
             logger.info(f"Skipping already processed: {key}")
             continue
         exists, match, score = is_already_processed(html)
@@ -351,14 +494,11 @@ def generate_shortcodes(input_json_file: str,theme_name: str):
        
         cleaned = invoke_with_retry(structured_model, messages,key, retries=5)
 
-        final_output.append(cleaned)    
-        mark_as_processed(key, html,cleaned)
-
-        with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(final_output, f, indent=2, ensure_ascii=False)
+        save_component(journal, key, html, cleaned)
             
         logger.info(f"Saved output for: {key}")
 
+    materialize_checkpoint(journal, output_file, [component_key(c) for c in shortcodes])
     logger.info(f"Output saved at: {output_file}")
     return output_file
 
@@ -1,5 +1,7 @@
 from langchain_nvidia_ai_endpoints import ChatNVIDIA
 from .track_expense import update_expense_log
+from .retry import call_with_retry
+from .cassette import cassette_model
 from dotenv import load_dotenv
 import os
 import json
@@ -12,9 +14,9 @@ from bs4 import BeautifulSoup
 load_dotenv()
 model_name = os.getenv("MODEL_NAME")
 
-model = ChatNVIDIA(model=model_name,
+model = cassette_model(lambda: ChatNVIDIA(model=model_name,
     max_completion_tokens=31384,
-)
+), f"config:{model_name}")
 
 
 def update_navigation_with_ai(original_data, ai_response_string):
@@ -58,9 +60,14 @@ def generate_navigation(soup):
     ```
     """)
     ]
-    response = model.invoke(messages)
-    update_expense_log("config",response.usage_metadata)
-    return response.content
+    def call():
+        response = model.invoke(messages)
+        update_expense_log("config",response.usage_metadata)
+        if not response.content:
+            raise ValueError("Empty response from model")
+        return response.content
+
+    return call_with_retry(call, key="config", retries=4, op="config")
 
 def create_config(config_path,html_path):
 
@@ -8,12 +8,14 @@ from langchain_community.callbacks import get_openai_callback
 from .schema import ReadmeMetadata
 from .logger import logger
 from .progress import push_log
+from .retry import call_with_retry
+from .cassette import cassette_model
 load_dotenv()
 model_name = os.getenv("MODEL_NAME")
 
-model = ChatNVIDIA(model=model_name,
+model = cassette_model(lambda: ChatNVIDIA(model=model_name,
     max_completion_tokens=31384,
-)
+), f"readme:{model_name}")
 structured_model = model.with_structured_output(ReadmeMetadata)
 
 with open("prompt/readme_metadata.md","r") as f:
@@ -28,17 +30,21 @@ def generate_metadata(theme_name:str):
     
     push_log(f"Generating metadata for theme: {theme_name}")
 
-    with get_openai_callback() as cb:
-        response = structured_model.invoke(messages)
-    
-    usage = {
-                "input_tokens": cb.prompt_tokens,
-                "output_tokens": cb.completion_tokens,
-                "total_tokens": cb.total_tokens
-            }
+    def call():
+        with get_openai_callback() as cb:
+            response = structured_model.invoke(messages)
+        
+        usage = {
+                    "input_tokens": cb.prompt_tokens,
+                    "output_tokens": cb.completion_tokens,
+                    "total_tokens": cb.total_tokens
+                }
+
 
+        update_expense_log("readme", usage)
+        return response
 
-    update_expense_log("readme", usage)
+    response = call_with_retry(call, key="readme", retries=4, op="readme")
     push_log(f"Generated metadata for theme: {theme_name}")
     if response :
         cleaned = response.model_dump()
@@ -0,0 +1,134 @@
+import contextvars
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Lock
+from .logger import logger
+from .concurrency import get_limiter, NEUTRAL
+from .track_expense import set_hedged
+
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "300"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") == "1"
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "5"))
+
+# abandoned (timed out / losing) calls keep their thread until the HTTP call returns
+_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="llm-call")
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies for one provider/op"""
+
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+        self.lock = Lock()
+
+    def record(self, latency: float):
+        with self.lock:
+            self.samples.append(latency)
+
+    def percentile(self, q: float):
+        with self.lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def hedge_after(self):
+        with self.lock:
+            if len(self.samples) < LLM_HEDGE_MIN_SAMPLES:
+                return None
+        return max(LLM_HEDGE_MIN_DELAY, self.percentile(0.95))
+
+
+_trackers = {}
+_trackers_lock = Lock()
+
+
+def get_tracker(provider: str, op: str) -> LatencyTracker:
+    with _trackers_lock:
+        key = (provider, op)
+        if key not in _trackers:
+            _trackers[key] = LatencyTracker()
+        return _trackers[key]
+
+
+def _run(fn, hedged: bool):
+    set_hedged(hedged)
+    try:
+        return fn()
+    finally:
+        set_hedged(False)
+
+
+def _submit(fn, hedged: bool):
+    ctx = contextvars.copy_context()
+    return _executor.submit(ctx.run, _run, fn, hedged)
+
+
+def run_with_deadline(fn, provider: str = "nvidia", op: str = "llm",
+                      timeout: float = LLM_CALL_TIMEOUT, hedge: bool = LLM_HEDGE,
+                      on_submit=None):
+    """
+    Run one model call with a deadline, optionally hedged.
+
+    If the call is still running after the observed p95 latency of this
+    provider/op, a duplicate is fired (only when the provider's limiter
+    has a free slot) and whichever succeeds first wins. The other one is
+    cancelled if it has not started yet, otherwise abandoned. Raises
+    TimeoutError once `timeout` seconds pass without a result.
+    on_submit(future) gets the primary call, so the caller's limiter slot
+    can be held until it returns even when it is abandoned.
+    """
+    tracker = get_tracker(provider, op)
+    hedge_after = tracker.hedge_after() if hedge else None
+
+    started = time.monotonic()
+    deadline = started + timeout
+    primary = _submit(fn, False)
+    if on_submit:
+        on_submit(primary)
+    futures = [primary]
+    starts = {primary: started}
+
+    try:
+        while True:
+            for f in futures:
+                if f.done() and f.exception() is None:
+                    tracker.record(time.monotonic() - starts[f])
+                    if f is not primary:
+                        logger.info(f"Hedged {op} request won after {time.monotonic() - started:.1f}s")
+                    return f.result()
+
+            pending = [f for f in futures if not f.done()]
+            if not pending:
+                raise primary.exception()
+
+            now = time.monotonic()
+            if now >= deadline:
+                raise TimeoutError(f"{op} call exceeded {timeout:g}s")
+
+            until = deadline
+            can_hedge = hedge_after is not None and len(futures) == 1
+            if can_hedge:
+                until = min(deadline, started + hedge_after)
+
+            done, _ = wait(pending, timeout=max(0.0, until - now),
+                           return_when=FIRST_COMPLETED)
+
+            if not done and can_hedge and time.monotonic() < deadline:
+                limiter = get_limiter(provider)
+                slot = limiter.try_acquire()
+                if slot is None:
+                    hedge_after = None
+                    continue
+
+                logger.info(f"Hedging {op} request after {hedge_after:.1f}s")
+                duplicate = _submit(fn, True)
+                duplicate.add_done_callback(lambda f: limiter.release(slot, NEUTRAL))
+                futures.append(duplicate)
+                starts[duplicate] = time.monotonic()
+    finally:
+        for f in futures:
+            f.cancel()
@@ -2,18 +2,22 @@ from pathlib import Path
 import shutil
 import json
 from bs4 import  NavigableString
-from playwright.async_api import async_playwright
 from .logger import logger
-from PIL import Image
 import hashlib
 import os
 
 
 
 from .for_readme import generate_metadata
+from .metrics import partials_lookups
+from .screenshots import capture_screenshots
+from .assets import build_manifest, copy_manifest
+from .asset_graph import ASSET_PRUNE, prune_manifest
 import re
 
 HOME_PRIORITY = {"index.html", "home.html", "main.html"}
+# only pick the homepage, no browser (benchmarks, CI)
+SKIP_SCREENSHOT = os.getenv("SKIP_SCREENSHOT", "0") == "1"
 
 
 def is_doc_path(path: Path) -> bool:
@@ -54,27 +58,17 @@ async def take_homepage_screenshot(unzip_path: Path, output_dir: Path,html_path=
             logger.info("No homepage HTML found.")
             return
 
-    png_path = output_dir / "screenshot.png"
+    if SKIP_SCREENSHOT:
+        logger.info(f"Screenshot skipped, homepage: {homepage}")
+        return homepage
+
     webp_path = output_dir / "screenshot.webp"
 
     logger.info(f"Homepage detected:{homepage}")
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False)
-        page = await browser.new_page()
-
-        await page.goto(homepage.resolve().as_uri())
-
-        await page.wait_for_timeout(3000)
-
-        await page.screenshot(path=str(png_path))
-
-        await browser.close()
-
-    img = Image.open(png_path)
-    img.save(webp_path, "webp", quality=85,optimize=True)
-    
-    png_path.unlink()
+    paths = await capture_screenshots(homepage.resolve().as_uri(), output_dir / "screenshots")
+    # first viewport doubles as the theme's main preview
+    shutil.copyfile(paths[0], webp_path)
 
     logger.info(f"Screenshot saved: {webp_path}")
     return homepage
@@ -107,8 +101,10 @@ def save_unique_partials(partials, partials_dir, source_folder_name):
             
             if html_hash in registry.values():
                 print("Skipping duplicate:", name)
+                partials_lookups.inc(result="hit")
                 skipped += 1
                 continue
+            partials_lookups.inc(result="miss")
 
         
         filename = f"{source_folder_name}_{name}.mustache"
@@ -131,83 +127,22 @@ def save_unique_partials(partials, partials_dir, source_folder_name):
 from pathlib import Path
 import shutil
 
-def copy_assets(theme_path: Path, output_dir: Path):
+def copy_assets(theme_path: Path, output_dir: Path, report_path=None):
+    """
+    Copy the theme's assets into output_dir/assets. With ASSET_PRUNE, only
+    those reachable from the templates already in output_dir are copied,
+    and the pruned ones are listed in report_path.
+    """
 
     assets_out = output_dir / "assets"
     assets_out.mkdir(parents=True, exist_ok=True)
 
-    asset_exts = {
-        ".css", ".js",
-        ".png", ".jpg", ".jpeg", ".svg", ".webp", ".gif",
-        ".woff", ".woff2", ".ttf", ".eot"
-    }
-
-    all_assets_path = []
-
-    
-    
-    
-    for item in theme_path.iterdir():
-
-        if not item.is_dir():
-            continue
-
-        if "doc" in item.name.lower():
-            continue
-
-        has_assets = any(
-            f.suffix.lower() in asset_exts
-            for f in item.rglob("*")
-            if f.is_file()
-        )
-
-        if not has_assets:
-            continue
-        
-        print(item.name)
-
-        if item.name.lower() == "assets":
-            
-            for sub in item.iterdir():
-                dest = assets_out / sub.name
-                if sub.is_dir():
-                    shutil.copytree(sub, dest, dirs_exist_ok=True)
-                else:
-                    shutil.copy2(sub, dest)
-                all_assets_path.append(dest)
-        else:
-            dest_folder = assets_out / item.name
-            shutil.copytree(item, dest_folder, dirs_exist_ok=True)
-            all_assets_path.append(dest_folder)
-        
-
-    
-    
-    
-    for file in theme_path.iterdir():
-
-        if not file.is_file():
-            continue
-
-        ext = file.suffix.lower()
-
-        if ext not in asset_exts:
-            continue
-
-        if ext == ".css":
-            dest_dir = assets_out / "css"
-        elif ext == ".js":
-            dest_dir = assets_out / "js"
-        else:
-            dest_dir = assets_out / "images"
-
-        dest_dir.mkdir(parents=True, exist_ok=True)
-
-        dest = dest_dir / file.name
-        shutil.copy2(file, dest)
-
-        all_assets_path.append(dest)
+    manifest = build_manifest(theme_path)
+    if ASSET_PRUNE:
+        manifest = prune_manifest(manifest, output_dir, report_path)
+    copy_manifest(manifest, assets_out)
 
+    all_assets_path = sorted({assets_out / dest.parts[0] for dest in manifest})
     return True, all_assets_path
 
 
@@ -0,0 +1,117 @@
+from pathlib import Path
+import json
+import os
+from threading import RLock
+from .logger import logger
+
+
+class JsonlJournal:
+    """
+    Append-only JSON-lines file.
+
+    Every append writes one line through a single open handle, so a record
+    costs O(1) I/O regardless of how many are already stored, and a crash
+    can at worst leave one truncated trailing line (skipped on read).
+
+    With a key function, later records replace earlier ones with the same
+    key; a read that finds replaced (or corrupt) lines rewrites the file
+    with one line per key. Reads happen once per run or page, so the
+    rewrite never lands on the append path.
+    """
+
+    def __init__(self, path, key=None):
+        self.path = Path(path)
+        self.key = key
+        self.lock = RLock()
+        self._fh = None
+        self._ino = None
+
+    def _open(self):
+        # temp/ can be wiped underneath us, never keep writing to an unlinked file
+        try:
+            ino = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            ino = None
+
+        if self._fh is not None and ino == self._ino:
+            return self._fh
+
+        self.close()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(self.path, "a", encoding="utf-8")
+        self._ino = os.fstat(self._fh.fileno()).st_ino
+
+        # a crash may have left a truncated line, don't glue the next one to it
+        if ino is not None and self._fh.tell() > 0:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._fh.write("\n")
+        return self._fh
+
+    def close(self):
+        with self.lock:
+            if self._fh is not None:
+                self._fh.close()
+            self._fh = None
+            self._ino = None
+
+    def append(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+
+        with self.lock:
+            fh = self._open()
+            fh.write(line)
+            fh.flush()
+
+    def read(self) -> list:
+        with self.lock:
+            if not self.path.exists():
+                return []
+
+            records = []
+            positions = {}
+            lines = 0
+            corrupt = 0
+
+            with open(self.path, "r", encoding="utf-8") as f:
+                for raw in f:
+                    raw = raw.strip()
+                    if not raw:
+                        continue
+                    lines += 1
+
+                    try:
+                        record = json.loads(raw)
+                    except json.JSONDecodeError:
+                        corrupt += 1
+                        continue
+
+                    if not self.key:
+                        records.append(record)
+                        continue
+
+                    k = self.key(record)
+                    if k in positions:
+                        records[positions[k]] = record
+                    else:
+                        positions[k] = len(records)
+                        records.append(record)
+
+            if corrupt:
+                logger.warning(f"Skipped {corrupt} corrupt lines in {self.path}")
+
+            if corrupt or lines > len(records):
+                self._write_all(records)
+
+            return records
+
+    def _write_all(self, records: list):
+        self.close()
+
+        tmp_file = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        tmp_file.replace(self.path)
+        logger.info(f"Compacted journal {self.path}: {len(records)} records")
@@ -0,0 +1,157 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import time
+from threading import Lock
+from .logger import logger
+
+CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR", "cache/llm"))
+CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "256"))
+
+
+def cache_key(*parts: str) -> str:
+    """sha256 over length-prefixed parts, so ("ab", "c") != ("a", "bc")"""
+    h = hashlib.sha256()
+    for part in parts:
+        data = str(part).encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """
+    Content-addressed, size-bounded cache of LLM responses on disk.
+
+    Lives outside temp/ so it survives between runs. Every entry is one
+    file; the file mtime is bumped on each hit and the least recently used
+    entries are evicted once the directory grows beyond max_bytes.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self._entries = None
+        self._total = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _load_index(self):
+        if self._entries is not None:
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._entries = {}
+        self._total = 0
+
+        for f in self.directory.glob("*/*.json"):
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            self._entries[f.stem] = [st.st_mtime, st.st_size]
+            self._total += st.st_size
+
+    def _drop(self, key: str):
+        _, size = self._entries.pop(key, (0, 0))
+        self._total -= size
+        self._path(key).unlink(missing_ok=True)
+
+    def _evict(self):
+        if self._total <= self.max_bytes:
+            return
+
+        evicted = 0
+        by_age = sorted(self._entries.items(), key=lambda kv: kv[1][0])
+        for key, _ in by_age:
+            if self._total <= self.max_bytes:
+                break
+            self._drop(key)
+            evicted += 1
+
+        logger.info(f"LLM cache evicted {evicted} entries ({self.directory})")
+
+    def get(self, key: str):
+        with self.lock:
+            self._load_index()
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            path = self._path(key)
+            try:
+                value = json.loads(path.read_text(encoding="utf-8"))["value"]
+            except (OSError, json.JSONDecodeError, KeyError):
+                logger.warning(f"LLM cache entry unreadable, dropping: {path}")
+                self._drop(key)
+                self.misses += 1
+                return None
+
+            now = time.time()
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+            entry[0] = now
+
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value):
+        payload = json.dumps({"value": value}, ensure_ascii=False)
+
+        with self.lock:
+            self._load_index()
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+            tmp_file = path.with_suffix(".tmp")
+            tmp_file.write_text(payload, encoding="utf-8")
+            tmp_file.replace(path)
+
+            size = path.stat().st_size
+            _, old_size = self._entries.get(key, (0, 0))
+            self._entries[key] = [time.time(), size]
+            self._total += size - old_size
+
+            self._evict()
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+
+
+analysis_cache = ResponseCache(
+    CACHE_DIR / "analysis",
+    int(CACHE_MAX_MB * 1024 * 1024)
+)
+
+caches = {
+    "analysis": analysis_cache,
+}
+
+
+def cache_stats() -> dict:
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+def reset_cache_stats():
+    for cache in caches.values():
+        cache.reset_stats()
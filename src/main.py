@@ -1,18 +1,29 @@
 from .convert_shortcode import (generate_shortcodes,
-                                generate_shortcodes_batch)
-from .analyze_html import seperate_html
+                                queue_shortcodes,
+                                finish_shortcodes)
+from .analyze_html import (iter_html_jobs,
+                           process_html_file,
+                           analyze_shared_html)
+from .shared_sections import find_shared_sections
 from .create_mustache import save_mustache_files
 from .logger import logger
 from .separate_div import extract_components
 from pathlib import Path
 import json
-from concurrent.futures import ThreadPoolExecutor
+from .pipeline import Pipeline, Stage
+import os
 from .create_default import build_layout 
 import threading
+import contextvars
 import time
 from .track_expense import calculate_total_expense
+from .llm_cache import reset_cache_stats
+from .stages import stage, reset_stage_stats, log_stage_stats
+from .tracing import start_trace, finish_trace
+from .profiling import start_profile, finish_profile
 from .progress import WebSocketManager, push_log
 import shutil
+from .optimize_assets import ASSET_OPTIMIZE, optimize_assets
 from .helper import (give_full_theme_data,
                      create_output_structure,
                      create_readme,
@@ -26,6 +37,11 @@ from .create_config import create_config
 
 ws_manager = WebSocketManager()
 
+ANALYZE_WORKERS = int(os.getenv("ANALYZE_WORKERS", "4"))
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "2"))
+GENERATE_WORKERS = int(os.getenv("GENERATE_WORKERS", "3"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
 def for_now(folder_path):
 
     index_path = folder_path / "index.mustache"
@@ -40,12 +56,36 @@ def for_now(folder_path):
     footer_path.write_text("", encoding="utf-8")
 
 
-def give_shortcodes(input_path,analyzed_html_path,output_dir,theme_name):
+def is_doc_page(html_path):
+    return any("doc" in p.name.lower() for p in html_path.parents)
+
+
+def analyze_page(job, shared=None):
+    html_path, project_name, extract_folder = job
 
-    if any("doc" in p.name.lower() for p in input_path.parents):
-        logger.info(f"Skipping HTML inside doc folder: {input_path}")
+    if is_doc_page(html_path):
+        logger.info(f"Skipping HTML inside doc folder: {html_path}")
+        return None
+
+    analyzed_html_path = process_html_file(
+        html_path,
+        project_name=project_name,
+        extract_folder=extract_folder,
+        shared=shared
+    )
+    if not analyzed_html_path:
         return None
 
+    return {
+        "input_path": html_path,
+        "analyzed_html_path": analyzed_html_path,
+    }
+
+
+def extract_page(page, theme_name):
+    input_path = page["input_path"]
+    analyzed_html_path = page["analyzed_html_path"]
+
     if any("doc" in p.name.lower() for p in analyzed_html_path.parents):
         logger.info(f"Skipping config inside doc folder: {analyzed_html_path}")
         return None
@@ -55,99 +95,187 @@ def give_shortcodes(input_path,analyzed_html_path,output_dir,theme_name):
     push_log(f"Converting: {input_path.name} file")
     logger.info(f"[{thread_name} | ID={thread_id}] Processing: {analyzed_html_path}")
 
-    partials_dir = output_dir / "partials"
-    shortcodes_dir = output_dir / "shortcodes"
-
-    partials_dir.mkdir(exist_ok=True)
-    shortcodes_dir.mkdir(parents=True, exist_ok=True)
-
-    partials_path,shortcodes_path = extract_components(
+    extracted = extract_components(
             html_file=input_path,
             config_file=analyzed_html_path,
             theme_name=theme_name
         )
-    
+    if not extracted:
+        return None
+
+    page["partials_path"], page["shortcodes_path"] = extracted
+    return page
 
 
-    generated_shortcode_path = generate_shortcodes_batch(shortcodes_path,theme_name)
+def queue_page(page, theme_name):
+    page["queued_shortcodes"] = queue_shortcodes(
+        page["shortcodes_path"],
+        theme_name
+    )
+    return page
+
+
+def generate_page(page):
+    page["generated_shortcode_path"] = finish_shortcodes(page.pop("queued_shortcodes"))
+    return page
 
-    with open(partials_path, "r", encoding="utf-8") as f:
+
+def write_page(page, output_dir):
+    partials_dir = output_dir / "partials"
+    shortcodes_dir = output_dir / "shortcodes"
+
+    partials_dir.mkdir(exist_ok=True)
+    shortcodes_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(page["partials_path"], "r", encoding="utf-8") as f:
         partials = json.load(f)
     
-    save_unique_partials(partials, partials_dir, input_path.stem)
-    save_mustache_files(generated_shortcode_path,shortcodes_dir)
+    with stage("partials", page=page["input_path"].name):
+        save_unique_partials(partials, partials_dir, page["input_path"].stem)
+    with stage("mustache", page=page["input_path"].name):
+        save_mustache_files(page["generated_shortcode_path"],shortcodes_dir)
     return output_dir
 
-def run_shortcode_generation(input_path, converted_theme_path, OUTPUT_DIR_NAME):
-    futures = []
-    unzip_path = None
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        for path, html_path, unzip_path in seperate_html(input_path):
-            futures.append(
-                executor.submit(
-                    give_shortcodes,
-                    html_path,
-                    path,
-                    converted_theme_path,
-                    OUTPUT_DIR_NAME
-                )
-            )
-        unzip_path = unzip_path
 
-    for f in futures:
-        f.result()
+def page_attrs(item):
+    """Span attributes of a pipeline item (job tuple or page dict)"""
+    path = item[0] if isinstance(item, tuple) else item["input_path"]
+    return {"page": path.name}
+
+def run_shortcode_generation(input_path, converted_theme_path, OUTPUT_DIR_NAME):
+    """
+    analyze -> extract -> queue shortcodes, each stage with its own workers
+    so page analysis calls overlap. Every page's components are queued on
+    the shared scheduler before any page is waited for; pages are then
+    written one by one, as the partials registry is read-modify-write.
+    """
+    jobs = list(iter_html_jobs(input_path))
+    unzip_path = jobs[-1][2] if jobs else None
+
+    # header/footer/menus repeated on every page are analyzed only once
+    shared = find_shared_sections(
+        [job[0] for job in jobs if not is_doc_page(job[0])]
+    )
+    if shared:
+        threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(shared.analyze, analyze_shared_html),
+            name="analyze-shared",
+            daemon=True
+        ).start()
+
+    pipeline = Pipeline([
+        Stage("analyze",
+              lambda job: analyze_page(job, shared),
+              ANALYZE_WORKERS, describe=page_attrs),
+        Stage("extract",
+              lambda page: extract_page(page, OUTPUT_DIR_NAME),
+              EXTRACT_WORKERS, describe=page_attrs),
+        Stage("queue",
+              lambda page: queue_page(page, OUTPUT_DIR_NAME),
+              GENERATE_WORKERS, describe=page_attrs),
+    ], queue_size=PIPELINE_QUEUE_SIZE)
+    pages = pipeline.run(jobs)
+
+    errors = []
+    for page in pages:
+        try:
+            with stage("page.generate", **page_attrs(page)):
+                generate_page(page)
+            with stage("page.write", **page_attrs(page)):
+                write_page(page, converted_theme_path)
+        except Exception as e:
+            logger.exception(f"[write] failed: {e}")
+            errors.append(e)
+
+    if errors:
+        raise errors[0]
 
     return unzip_path
 
-async def main(input_path,theme_data):
-    theme_data = give_full_theme_data(theme_data)
+async def main(input_path, theme_data, profile=None):
+    """
+    Convert the theme zip at input_path. With profile (default: PROFILE=1)
+    the job runs under the sampling profiler and its reports are saved to
+    FinalShortcodes/<theme>/profile, next to the zip.
+    """
+    profiler = start_profile(Path(input_path).stem, profile)
+    try:
+        return await convert(input_path, theme_data)
+    finally:
+        finish_profile(profiler, Path("FinalShortcodes") / Path(input_path).stem / "profile")
+
+async def convert(input_path,theme_data):
+    reset_cache_stats()
+    reset_stage_stats()
+    start_trace(Path(input_path).stem)
+    with stage("metadata"):
+        theme_data = give_full_theme_data(theme_data)
     start_time = time.time()
     OUTPUT_DIR_NAME = Path(input_path).stem
     OUTPUT_DIR = Path("FinalShortcodes") / OUTPUT_DIR_NAME
     logger.info(OUTPUT_DIR)
     converted_theme_path = create_output_structure(OUTPUT_DIR)
 
-    # for file in ["expense.json","partials_registry.json","processed_blocks.json"]:
+    # for file in ["expense.json","partials_registry.json","processed_blocks.jsonl"]:
     #     if Path(f"temp/{file}").exists():
     #         Path(f"temp/{file}").unlink()
 
-    create_readme(theme_data,OUTPUT_DIR)
+    with stage("readme"):
+        create_readme(theme_data,OUTPUT_DIR)
     config_file = converted_theme_path / "config.json"
     unzip_path=None
     logger.info("Analyzing HTML files One by one... ")
-    unzip_path = await asyncio.to_thread(
-        run_shortcode_generation,
-        input_path,
-        converted_theme_path,
-        OUTPUT_DIR_NAME
-    )
+    with stage("pages"):
+        unzip_path = await asyncio.to_thread(
+            run_shortcode_generation,
+            input_path,
+            converted_theme_path,
+            OUTPUT_DIR_NAME
+        )
 
     if unzip_path and unzip_path.exists():
-        html_path = await take_homepage_screenshot(unzip_path, OUTPUT_DIR)
-        create_config(config_file,html_path)
-        is_assets_exits = copy_assets(html_path.parent, converted_theme_path)
+        with stage("screenshot"):
+            html_path = await take_homepage_screenshot(unzip_path, OUTPUT_DIR)
+        with stage("config"):
+            create_config(config_file,html_path)
     else:
-        await take_homepage_screenshot("", OUTPUT_DIR,html_path=input_path)
+        with stage("screenshot"):
+            await take_homepage_screenshot("", OUTPUT_DIR,html_path=input_path)
 
-    if is_assets_exits:
-        logger.info("Assets copied... ")
-    else:
-        logger.info("Assets not copied. Copying static files manually...")
-    
     temp_folder_name = html_path.name.split(".")[0]
     partial_path = f"temp/AnalyzedComponentsJson/{OUTPUT_DIR_NAME}/{temp_folder_name}/partials.json"
     shortcode_path = f"temp/AnalyzedComponentsJson/{OUTPUT_DIR_NAME}/{temp_folder_name}/shortcodes.json"
 
-    build_layout(html_path,converted_theme_path,partial_path,shortcode_path,"default.mustache")
-    copy_404_page(converted_theme_path,OUTPUT_DIR_NAME)
+    with stage("layout"):
+        build_layout(html_path,converted_theme_path,partial_path,shortcode_path,"default.mustache")
+        copy_404_page(converted_theme_path,OUTPUT_DIR_NAME)
 
+    # after every template is written: only assets they reach are copied
+    if unzip_path and unzip_path.exists():
+        with stage("assets"):
+            is_assets_exits = copy_assets(
+                html_path.parent, converted_theme_path,
+                report_path=OUTPUT_DIR.parent / f"{OUTPUT_DIR_NAME}.pruned-assets.json"
+            )
+        if ASSET_OPTIMIZE:
+            with stage("optimize"):
+                await asyncio.to_thread(optimize_assets, converted_theme_path / "assets")
+
+    if is_assets_exits:
+        logger.info("Assets copied... ")
+    else:
+        logger.info("Assets not copied. Copying static files manually...")
 
     push_log("Zipping final output...")
 
     for_now(converted_theme_path)
-    final_zip = zip_output_folder(OUTPUT_DIR)
+    with stage("zip"):
+        final_zip = zip_output_folder(OUTPUT_DIR)
 
     calculate_total_expense()
+    # next to the zip, not inside it
+    finish_trace(OUTPUT_DIR / "trace.json")
 
     folder_to_delete = ["temp"]
     for folder in folder_to_delete:
@@ -171,6 +299,7 @@ async def main(input_path,theme_data):
     minutes = elapsed / 60
     push_log("Conversion complete!")
 
+    log_stage_stats()
     logger.info(f"Time taken in generating: {minutes:.2f} minutes")
     return final_zip
 
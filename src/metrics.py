@@ -0,0 +1,212 @@
+import math
+import os
+from threading import Lock
+from .concurrency import limiter_stats
+from .llm_cache import cache_stats
+
+
+def model_name() -> str:
+    """Model label, read per call: the env can change after import (benchmarks, tests)"""
+    return os.getenv("MODEL_NAME", "")
+
+
+# seconds; LLM calls run from sub-second to minutes
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None) -> str:
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.lock = Lock()
+        self.values = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list:
+        with self.lock:
+            items = sorted(self.values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.label_names, key)} {_number(value)}"
+            for key, value in items
+        ]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Set/inc/dec by hand, or computed at scrape time by fn() -> {label tuple: value}"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels=(), fn=None):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> list:
+        if self.fn:
+            values = self.fn()
+            with self.lock:
+                self.values = {tuple(str(v) for v in k): val for k, val in values.items()}
+        return super().render()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["counts"][i] += 1
+                    break
+            entry["sum"] += value
+            entry["count"] += 1
+
+    def render(self) -> list:
+        with self.lock:
+            items = sorted(
+                (key, {"counts": list(e["counts"]), "sum": e["sum"], "count": e["count"]})
+                for key, e in self.values.items()
+            )
+
+        lines = self.header()
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry["counts"]):
+                cumulative += count
+                labels = _labels(self.label_names, key, [("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_number(entry['sum'])}")
+            lines.append(f"{self.name}_count{labels} {entry['count']}")
+        return lines
+
+
+REGISTRY = []
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _ratio(counter: Counter) -> dict:
+    with counter.lock:
+        hits = counter.values.get(("hit",), 0)
+        misses = counter.values.get(("miss",), 0)
+    total = hits + misses
+    return {(): hits / total if total else 0.0}
+
+
+def _llm_cache_ratios() -> dict:
+    return {(name,): stats["hit_ratio"] for name, stats in cache_stats().items()}
+
+
+def _llm_limits() -> dict:
+    return {(provider,): stats["limit"] for provider, stats in limiter_stats().items()}
+
+
+stage_seconds = Histogram(
+    "converter_stage_seconds", "Duration of conversion stages", ["stage"]
+)
+llm_request_seconds = Histogram(
+    "converter_llm_request_seconds", "Duration of LLM call attempts",
+    ["provider", "model", "op", "outcome"]
+)
+llm_tokens = Counter(
+    "converter_llm_tokens_total", "LLM tokens used", ["model", "direction"]
+)
+llm_cost = Counter(
+    "converter_llm_cost_total", "Estimated LLM cost, same currency as the expense summary",
+    ["model", "direction"]
+)
+llm_retries = Counter(
+    "converter_llm_retries_total", "LLM call attempts that failed and were retried",
+    ["provider", "op", "kind"]
+)
+llm_inflight = Gauge(
+    "converter_llm_requests_in_flight", "LLM call attempts in progress", ["provider"]
+)
+llm_concurrency_limit = Gauge(
+    "converter_llm_concurrency_limit", "Current AIMD limit per provider", ["provider"],
+    fn=_llm_limits
+)
+jobs_inflight = Gauge(
+    "converter_jobs_in_flight", "Theme conversions in progress"
+)
+jobs_total = Counter(
+    "converter_jobs_total", "Finished theme conversions", ["outcome"]
+)
+similarity_lookups = Counter(
+    "converter_similarity_lookups_total", "Similarity DB lookups for components", ["result"]
+)
+similarity_hit_ratio = Gauge(
+    "converter_similarity_hit_ratio", "Share of components found in the similarity DB",
+    fn=lambda: _ratio(similarity_lookups)
+)
+partials_lookups = Counter(
+    "converter_partials_registry_lookups_total", "Partials checked against the registry", ["result"]
+)
+partials_hit_ratio = Gauge(
+    "converter_partials_registry_hit_ratio", "Share of partials skipped as duplicates",
+    fn=lambda: _ratio(partials_lookups)
+)
+llm_cache_hit_ratio = Gauge(
+    "converter_llm_cache_hit_ratio", "LLM response cache hit ratio", ["cache"],
+    fn=_llm_cache_ratios
+)
@@ -0,0 +1,229 @@
+import gzip
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from PIL import Image
+from .assets import file_hash, place_file
+from .logger import logger
+
+ASSET_OPTIMIZE = os.getenv("ASSET_OPTIMIZE", "0") == "1"
+ASSET_OPTIMIZE_WORKERS = int(os.getenv("ASSET_OPTIMIZE_WORKERS", "0")) or os.cpu_count() or 1
+# shared by every theme, so vendor files are optimized once
+ASSET_OPTIMIZE_CACHE_DIR = Path(os.getenv("ASSET_OPTIMIZE_CACHE_DIR", "cache/assets"))
+JPEG_QUALITY = int(os.getenv("ASSET_JPEG_QUALITY", "85"))
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", "85"))
+
+RASTER_EXTS = {".png", ".jpg", ".jpeg"}
+TEXT_EXTS = {".css", ".js", ".svg"}
+
+# bump when the optimizers change, so cached results are redone
+OPTIMIZER_VERSION = 3
+
+
+def settings_tag() -> str:
+    settings = [OPTIMIZER_VERSION, JPEG_QUALITY, WEBP_QUALITY]
+    return hashlib.blake2b(json.dumps(settings).encode(), digest_size=4).hexdigest()
+
+
+def minify_css(css: str) -> str:
+    """
+    Drop comments (except /*! licenses) and collapse whitespace, leaving
+    strings alone. Spaces are only removed next to { } ; , and after :,
+    where they never matter ("a :hover" keeps its meaning).
+    """
+    out = []
+    i, n = 0, len(css)
+    while i < n:
+        c = css[i]
+        if c in "\"'":
+            end = i + 1
+            while end < n and css[end] != c:
+                end += 2 if css[end] == "\\" else 1
+            out.append(css[i:end + 1])
+            i = end + 1
+        elif css.startswith("/*", i):
+            end = css.find("*/", i + 2)
+            end = n if end < 0 else end + 2
+            if css.startswith("/*!", i):
+                out.append(css[i:end])
+            elif out and out[-1][-1:] not in "{};,: " and end < n and \
+                    css[end] not in "{};,:" and not css[end].isspace():
+                # "a/* c */b" is two tokens, not "ab"
+                out.append(" ")
+            i = end
+        elif c.isspace():
+            while i < n and css[i].isspace():
+                i += 1
+            if out and out[-1][-1:] not in "{};,: " and i < n and css[i] not in "{};,":
+                out.append(" ")
+        else:
+            if c == "}" and out and out[-1] == ";":
+                out.pop()
+            out.append(c)
+            i += 1
+    return "".join(out).strip()
+
+
+def minify_js(js: str) -> str:
+    """
+    Whitespace only: indentation, trailing spaces and blank lines. Without
+    a parser, anything more (comments, newlines) risks regex literals and
+    automatic semicolon insertion. Template literals and backslash-continued
+    strings are left untouched, since their leading whitespace is content.
+    """
+    if "`" in js or any(line.rstrip().endswith("\\") for line in js.splitlines()):
+        return js
+    lines = (line.strip() for line in js.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _write(path: Path, data: bytes):
+    """Write via a temp file + rename: never into a (possibly hardlinked) file"""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def optimize_bytes(data: bytes, ext: str) -> dict:
+    """Optimized content and variants of one asset: {"optimized", "webp", "gz"}"""
+    results = {}
+
+    if ext in RASTER_EXTS:
+        img = Image.open(io.BytesIO(data))
+        # re-saving keeps only the first frame of an animated PNG
+        if getattr(img, "n_frames", 1) > 1:
+            return results
+        img.load()
+        icc_profile = img.info.get("icc_profile")
+
+        out = io.BytesIO()
+        if ext == ".png":
+            img.save(out, "png", optimize=True, icc_profile=icc_profile)
+        else:
+            img.save(out, "jpeg", quality=JPEG_QUALITY, optimize=True, progressive=True,
+                     exif=img.info.get("exif", b""), icc_profile=icc_profile)
+        if out.tell() < len(data):
+            results["optimized"] = out.getvalue()
+
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info or "A" in img.mode else "RGB")
+        out = io.BytesIO()
+        if ext == ".png":
+            img.save(out, "webp", lossless=True, icc_profile=icc_profile)
+        else:
+            img.save(out, "webp", quality=WEBP_QUALITY, icc_profile=icc_profile)
+        if out.tell() < len(results.get("optimized", data)):
+            results["webp"] = out.getvalue()
+
+    elif ext in TEXT_EXTS:
+        text = data.decode("utf-8")
+        if ext == ".css":
+            minified = minify_css(text).encode("utf-8")
+        elif ext == ".js":
+            minified = minify_js(text).encode("utf-8")
+        else:
+            minified = data
+        if len(minified) < len(data):
+            results["optimized"] = minified
+
+        content = results.get("optimized", data)
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) < len(content):
+            results["gz"] = compressed
+
+    return results
+
+
+def _variant_path(path: Path, name: str) -> Path:
+    return path if name == "optimized" else path.with_name(f"{path.name}.{name}")
+
+
+def optimize_file(path: str, cache_dir: str) -> dict:
+    """
+    Optimize one asset in place and write its .webp/.gz siblings. Results
+    are cached under the source's content hash; runs in a worker process.
+    """
+    path = Path(path)
+    ext = path.suffix.lower()
+    size = path.stat().st_size
+    stats = {"path": str(path), "before": size, "after": size, "cached": False}
+
+    minified_name = path.name.lower().endswith((".min.css", ".min.js"))
+    if ext not in RASTER_EXTS | TEXT_EXTS or size == 0:
+        return stats
+
+    digest = file_hash(path)
+    # .min files keep their bytes, so they don't share an entry with the same content
+    tag = settings_tag() + ("-min" if minified_name else "")
+    entry = Path(cache_dir) / digest[:2] / f"{digest}-{tag}"
+    meta_file = entry / "meta.json"
+
+    try:
+        if meta_file.exists():
+            names = json.loads(meta_file.read_text(encoding="utf-8"))
+            stats["cached"] = True
+        else:
+            results = optimize_bytes(path.read_bytes(), ext)
+            if minified_name:
+                results.pop("optimized", None)
+            entry.mkdir(parents=True, exist_ok=True)
+            for name, data in results.items():
+                _write(entry / name, data)
+            names = sorted(results)
+            # written last: an entry without it is incomplete and redone
+            _write(meta_file, json.dumps(names).encode("utf-8"))
+
+        for name in names:
+            target = _variant_path(path, name)
+            tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+            place_file(entry / name, tmp, mode="reflink")
+            os.replace(tmp, target)
+    except (OSError, ValueError, UnicodeDecodeError, Image.DecompressionBombError) as e:
+        stats["error"] = f"{type(e).__name__}: {e}"
+        return stats
+
+    stats["after"] = path.stat().st_size
+    stats["variants"] = [name for name in names if name != "optimized"]
+    return stats
+
+
+def optimize_assets(assets_dir: Path, cache_dir: Path = ASSET_OPTIMIZE_CACHE_DIR,
+                    workers: int = ASSET_OPTIMIZE_WORKERS) -> dict:
+    """
+    Recompress images (+ WebP variants), minify CSS/JS and add .gz
+    siblings for every file under assets_dir, on a process pool.
+    """
+    started = time.perf_counter()
+    files = [str(p) for p in Path(assets_dir).rglob("*")
+             if p.is_file() and p.suffix.lower() in RASTER_EXTS | TEXT_EXTS]
+    if not files:
+        return {"files": 0}
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # spawn: forking the threaded server process can deadlock the children
+    with ProcessPoolExecutor(max_workers=min(workers, len(files)),
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        results = list(pool.map(optimize_file, files, [str(cache_dir)] * len(files),
+                                chunksize=max(1, len(files) // (workers * 4))))
+
+    summary = {
+        "files": len(results),
+        "cached": sum(r["cached"] for r in results),
+        "before": sum(r["before"] for r in results),
+        "after": sum(r["after"] for r in results),
+        "variants": sum(len(r.get("variants", [])) for r in results),
+        "errors": [r for r in results if "error" in r],
+    }
+    for failed in summary["errors"]:
+        logger.warning(f"Asset not optimized: {failed['path']} ({failed['error']})")
+    logger.info(
+        f"Optimized {summary['files']} assets ({summary['cached']} from cache) in "
+        f"{time.perf_counter() - started:.2f}s: {summary['before'] / 2**20:.2f} MiB -> "
+        f"{summary['after'] / 2**20:.2f} MiB, {summary['variants']} .webp/.gz variants"
+    )
+    return summary
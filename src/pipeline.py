@@ -0,0 +1,105 @@
+import contextvars
+import queue
+import threading
+from .logger import logger
+from .stages import stage as timed
+
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a Pipeline.
+
+    func receives an item from the previous stage and returns the item for
+    the next one; returning None drops the item (skipped page, missing file).
+    describe(item), if given, returns the attributes its span is tagged with.
+    """
+
+    def __init__(self, name: str, func, workers: int = 1, describe=None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.describe = describe
+
+
+class Pipeline:
+    """
+    Staged worker pipeline connected by bounded queues.
+
+    Every stage runs its own pool of threads, so a slow stage (an LLM call)
+    for one item overlaps with the other stages working on the next items.
+    The bounded queues apply back-pressure to the producer instead of
+    buffering the whole theme in memory.
+    """
+
+    def __init__(self, stages, queue_size: int = 4):
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in stages]
+        self.results = []
+        self.errors = []
+        self.lock = threading.Lock()
+
+    def _worker(self, index: int, finished: threading.Barrier):
+        stage = self.stages[index]
+        inbox = self.queues[index]
+        is_last = index == len(self.stages) - 1
+
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+
+            try:
+                attrs = stage.describe(item) if stage.describe else {}
+                with timed(f"page.{stage.name}", **attrs):
+                    result = stage.func(item)
+            except Exception as e:
+                logger.exception(f"[{stage.name}] failed: {e}")
+                with self.lock:
+                    self.errors.append(e)
+                continue
+
+            if result is None:
+                continue
+
+            if is_last:
+                with self.lock:
+                    self.results.append(result)
+            else:
+                self.queues[index + 1].put(result)
+
+        # last worker of this stage to finish closes the next stage
+        if finished.wait() == 0 and not is_last:
+            for _ in range(self.stages[index + 1].workers):
+                self.queues[index + 1].put(_DONE)
+
+    def run(self, items):
+        threads = []
+        for index, stage in enumerate(self.stages):
+            finished = threading.Barrier(stage.workers)
+            for n in range(stage.workers):
+                # each worker runs in a copy of the caller's context (job trace)
+                t = threading.Thread(
+                    target=contextvars.copy_context().run,
+                    args=(self._worker, index, finished),
+                    name=f"{stage.name}-{n}",
+                    daemon=True
+                )
+                t.start()
+                threads.append(t)
+
+        try:
+            for item in items:
+                self.queues[0].put(item)
+        finally:
+            for _ in range(self.stages[0].workers):
+                self.queues[0].put(_DONE)
+
+            for t in threads:
+                t.join()
+
+        if self.errors:
+            raise self.errors[0]
+
+        return self.results
@@ -0,0 +1,236 @@
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from .logger import logger
+
+PROFILE_ENABLED = os.getenv("PROFILE", "0") == "1"
+# seconds between stack samples
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "25"))
+# frames kept per allocation traceback; deeper tracebacks make the
+# BeautifulSoup-heavy stages several times slower still
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "1"))
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        # no procfs: fall back to the peak, the best getrusage offers
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+_frame_names = {}
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    name = _frame_names.get(code)
+    if name is None:
+        qualname = getattr(code, "co_qualname", code.co_name)
+        name = _frame_names[code] = (
+            f"{qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        )
+    return name
+
+
+class Profiler:
+    """
+    Sampling profiler for one conversion job.
+
+    A background thread samples the RSS and the stacks of the threads with
+    one of this job's stages open every PROFILE_INTERVAL seconds, so other
+    jobs' threads stay out of it. Samples are rooted at those stages, so
+    time in BeautifulSoup is attributed to e.g. page.extract.
+    Top-level stages (those opened on the job's own thread) also take
+    tracemalloc snapshots at their boundaries for the allocation report.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.owner = threading.get_ident()
+        self.stacks = {}
+        self.samples = 0
+        self.thread_stages = {}
+        self.stage_memory = {}
+        self.stage_allocations = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.sampler = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self.started_tracemalloc = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+            self.started_tracemalloc = True
+        self.started = time.perf_counter()
+        self.sampler.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.sampler.join()
+        self.elapsed = time.perf_counter() - self.started
+        self.final_snapshot = tracemalloc.take_snapshot()
+        self.traced_peak = tracemalloc.get_traced_memory()[1]
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self.stopped.wait(PROFILE_INTERVAL):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            rss = current_rss_bytes()
+
+            with self.lock:
+                open_stages = {ident: list(s) for ident, s in self.thread_stages.items() if s}
+                for stages in open_stages.values():
+                    for name in stages:
+                        entry = self.stage_memory.get(name)
+                        if entry:
+                            entry["peak_rss_bytes"] = max(entry["peak_rss_bytes"], rss)
+
+                for ident, frame in sys._current_frames().items():
+                    if ident == own or ident not in open_stages:
+                        continue
+                    frames = []
+                    while frame is not None:
+                        frames.append(_frame_name(frame))
+                        frame = frame.f_back
+                    root = [names.get(ident, str(ident))]
+                    root += [f"stage:{name}" for name in open_stages.get(ident, [])]
+                    key = ";".join(root + frames[::-1])
+                    self.stacks[key] = self.stacks.get(key, 0) + 1
+                self.samples += 1
+
+    def enter_stage(self, name: str):
+        ident = threading.get_ident()
+        rss = current_rss_bytes()
+        with self.lock:
+            self.thread_stages.setdefault(ident, []).append(name)
+            entry = self.stage_memory.setdefault(
+                name, {"calls": 0, "peak_rss_bytes": 0, "rss_delta_bytes": 0}
+            )
+            entry["calls"] += 1
+            entry["peak_rss_bytes"] = max(entry["peak_rss_bytes"], rss)
+        return rss, (tracemalloc.take_snapshot() if ident == self.owner else None)
+
+    def exit_stage(self, name: str, rss_before: int, snapshot_before):
+        ident = threading.get_ident()
+        rss = current_rss_bytes()
+        with self.lock:
+            self.thread_stages[ident].remove(name)
+            entry = self.stage_memory[name]
+            entry["peak_rss_bytes"] = max(entry["peak_rss_bytes"], rss)
+            entry["rss_delta_bytes"] += rss - rss_before
+
+        if snapshot_before is not None:
+            diff = tracemalloc.take_snapshot().compare_to(snapshot_before, "traceback")
+            self.stage_allocations.append((name, diff[:PROFILE_TOP_N]))
+
+    def folded(self) -> str:
+        """Collapsed stacks, for flamegraph.pl, speedscope or inferno"""
+        with self.lock:
+            stacks = sorted(self.stacks.items())
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def allocation_report(self) -> str:
+        lines = [
+            f"Allocation report for {self.name}",
+            f"Sampled {self.samples} times over {self.elapsed:.1f}s, "
+            f"traced peak {self.traced_peak / 2**20:.1f} MiB",
+            "",
+        ]
+        for name, diff in self.stage_allocations:
+            lines.append(f"== stage {name}: top {len(diff)} allocation changes ==")
+            for stat in diff:
+                lines.append(f"{stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8d} blocks  "
+                             f"{stat.traceback[0]}")
+            lines.append("")
+
+        stats = self.final_snapshot.statistics("lineno")[:PROFILE_TOP_N]
+        lines.append(f"== still allocated at the end: top {len(stats)} lines ==")
+        for stat in stats:
+            lines.append(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {stat.traceback[0]}")
+        return "\n".join(lines) + "\n"
+
+    def save(self, folder: Path):
+        folder = Path(folder)
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / "profile.folded").write_text(self.folded(), encoding="utf-8")
+        (folder / "allocations.txt").write_text(self.allocation_report(), encoding="utf-8")
+        with self.lock:
+            memory = {name: dict(entry) for name, entry in self.stage_memory.items()}
+        (folder / "memory.json").write_text(json.dumps({
+            "job": self.name,
+            "samples": self.samples,
+            "seconds": self.elapsed,
+            "traced_peak_bytes": self.traced_peak,
+            "stages": memory,
+        }, indent=2), encoding="utf-8")
+        logger.info(f"Profile with {self.samples} samples saved: {folder}")
+        return folder
+
+
+# the session running, if any; tracemalloc and the sampler are process-wide
+_profiler = None
+_profiler_lock = threading.Lock()
+# the job's own profiler, carried to its worker threads with the context
+_current_profiler = contextvars.ContextVar("current_profiler", default=None)
+
+
+def start_profile(name: str, enabled: bool = None):
+    """
+    Profile the job until finish_profile(); enabled defaults to PROFILE=1.
+    Only one job is profiled at a time, a second one started meanwhile
+    runs unprofiled. Stages only report to the profiler of their own job.
+    """
+    global _profiler
+    if not (PROFILE_ENABLED if enabled is None else enabled):
+        return None
+
+    with _profiler_lock:
+        if _profiler is not None:
+            logger.warning(f"Profiler busy with {_profiler.name}, not profiling {name}")
+            return None
+        _profiler = Profiler(name)
+        _profiler.start()
+        _current_profiler.set(_profiler)
+        return _profiler
+
+
+def finish_profile(profiler, folder: Path):
+    """Stop the profiler returned by start_profile and save its reports into folder"""
+    global _profiler
+    if profiler is None:
+        return None
+
+    _current_profiler.set(None)
+    with _profiler_lock:
+        _profiler = None
+    profiler.stop()
+    return profiler.save(folder)
+
+
+@contextmanager
+def profile_stage(name: str):
+    profiler = _current_profiler.get()
+    if profiler is None:
+        yield
+        return
+
+    rss, snapshot = profiler.enter_stage(name)
+    try:
+        yield
+    finally:
+        profiler.exit_stage(name, rss, snapshot)
@@ -0,0 +1,252 @@
+import json
+import os
+import random
+import re
+import time
+from threading import Lock
+from .logger import logger
+from .concurrency import get_limiter, OK, CONGESTED, NEUTRAL
+from .hedging import run_with_deadline, LLM_CALL_TIMEOUT
+from .tracing import span
+from .metrics import model_name, llm_inflight, llm_request_seconds, llm_retries
+
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "2"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "60"))
+CIRCUIT_FAILURES = int(os.getenv("CIRCUIT_FAILURES", "5"))
+CIRCUIT_COOLDOWN = float(os.getenv("CIRCUIT_COOLDOWN", "30"))
+
+RATE_LIMIT = "rate_limit"
+TIMEOUT = "timeout"
+SERVER = "server"
+INVALID = "invalid"
+FATAL = "fatal"
+UNKNOWN = "unknown"
+
+# failures that say something about the provider's health
+PROVIDER_FAILURES = {TIMEOUT, SERVER, UNKNOWN}
+# failures that mean we are sending too much
+CONGESTION = {RATE_LIMIT, TIMEOUT, SERVER}
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+def error_status(e: Exception):
+    for obj in (e, getattr(e, "response", None)):
+        for attr in ("status_code", "status", "code"):
+            value = getattr(obj, attr, None)
+            if isinstance(value, int) and 100 <= value < 600:
+                return value
+
+    match = re.search(
+        r"(?:\[|status(?: code)?[ :=]*|HTTP(?:/\d\.\d)? )(\d{3})\b",
+        str(e),
+        re.IGNORECASE
+    )
+    return int(match.group(1)) if match else None
+
+
+def classify_error(e: Exception) -> str:
+    name = type(e).__name__.lower()
+    message = str(e).lower()
+    status = error_status(e)
+
+    if status == 429 or "rate limit" in message or "too many requests" in message \
+            or "resourceexhausted" in name or "ratelimit" in name:
+        return RATE_LIMIT
+
+    if isinstance(e, TimeoutError) or "timeout" in name or "timed out" in message \
+            or status in (408, 504):
+        return TIMEOUT
+
+    if status and status >= 500 or "connection" in name or "serviceunavailable" in name:
+        return SERVER
+
+    if isinstance(e, (json.JSONDecodeError, ValueError)) or "validation" in name \
+            or "outputparser" in name:
+        return INVALID
+
+    if status and 400 <= status < 500:
+        return FATAL
+
+    return UNKNOWN
+
+
+def retry_after(e: Exception):
+    """Seconds the provider asked us to wait, if it said so"""
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+    match = re.search(
+        r"retry[ _-]?(?:after|in|delay)[\"':\s]*(\d+(?:\.\d+)?)\s*s?",
+        str(e),
+        re.IGNORECASE
+    )
+    return float(match.group(1)) if match else None
+
+
+def retry_delay(e: Exception, kind: str, attempt: int) -> float:
+    """Retry-After when given, else exponential backoff with full jitter"""
+    if kind == INVALID:
+        return random.uniform(0, 1)
+
+    asked = retry_after(e)
+    if asked is not None:
+        return min(asked, RETRY_MAX_DELAY) + random.uniform(0, 1)
+
+    cap = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return random.uniform(cap / 2, cap) if kind == RATE_LIMIT else random.uniform(0, cap)
+
+
+class CircuitBreaker:
+    """
+    Opens after CIRCUIT_FAILURES consecutive provider failures; while open,
+    calls fail immediately. After CIRCUIT_COOLDOWN one trial call is let
+    through, and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, failures=CIRCUIT_FAILURES, cooldown=CIRCUIT_COOLDOWN):
+        self.name = name
+        self.max_failures = failures
+        self.cooldown = cooldown
+        self.lock = Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def is_open(self) -> bool:
+        with self.lock:
+            return (
+                self.opened_at is not None
+                and time.monotonic() - self.opened_at < self.cooldown
+            )
+
+    def before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+
+            if time.monotonic() - self.opened_at < self.cooldown or self.trial:
+                raise CircuitOpenError(
+                    f"{self.name} circuit open after {self.failures} failures"
+                )
+            self.trial = True
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                logger.info(f"[{self.name}] circuit closed")
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self, kind: str):
+        if kind not in PROVIDER_FAILURES:
+            with self.lock:
+                self.trial = False
+            return
+
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.max_failures:
+                if self.opened_at is None or self.trial:
+                    logger.error(f"[{self.name}] circuit opened ({self.failures} failures)")
+                self.opened_at = time.monotonic()
+            self.trial = False
+
+
+def wait(delay: float, breaker: CircuitBreaker):
+    """Sleep delay seconds, giving up early if the circuit opens meanwhile"""
+    deadline = time.monotonic() + delay
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if breaker.is_open():
+            raise CircuitOpenError(f"{breaker.name} circuit opened while waiting")
+        time.sleep(min(1.0, remaining))
+
+
+_breakers = {}
+_breakers_lock = Lock()
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker(provider)
+        return _breakers[provider]
+
+
+def call_with_retry(fn, key: str = "", retries: int = 5,
+                    provider: str = "nvidia", on_error=None, op: str = "llm"):
+    """
+    Call fn() until it returns, retrying transient failures.
+
+    Rate limits honor Retry-After, timeouts/5xx back off exponentially with
+    jitter, malformed or schema-invalid output is retried almost at once
+    and other 4xx errors are raised immediately. When the provider's
+    circuit is open the call fails fast with CircuitOpenError.
+    Every attempt holds a slot of the provider's AIMD limiter and runs
+    under a deadline, hedged once it outlives the p95 latency of `op`.
+    Waiting for the slot is bounded by the same deadline and ends with
+    CircuitOpenError as soon as the circuit opens.
+    """
+    breaker = get_breaker(provider)
+    limiter = get_limiter(provider)
+
+    def check_circuit():
+        if breaker.is_open():
+            raise CircuitOpenError(f"{breaker.name} circuit opened while waiting for a slot")
+
+    for attempt in range(1, retries + 1):
+        started = limiter.acquire(timeout=LLM_CALL_TIMEOUT, check=check_circuit)
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            limiter.release(started, NEUTRAL)
+            raise
+        llm_inflight.inc(provider=provider)
+        # a call abandoned on timeout or to a winning hedge keeps its slot until it returns
+        calls = []
+
+        try:
+            with span(f"llm.{op}", "llm", key=key, provider=provider, attempt=attempt):
+                result = run_with_deadline(fn, provider=provider, op=op, on_submit=calls.append)
+        except Exception as e:
+            kind = classify_error(e)
+            llm_inflight.dec(provider=provider)
+            llm_request_seconds.observe(time.monotonic() - started, provider=provider,
+                                        model=model_name(), op=op, outcome=kind)
+            limiter.release(started, CONGESTED if kind in CONGESTION else NEUTRAL,
+                            until=calls[0] if calls else None)
+            breaker.record_failure(kind)
+            if breaker.is_open():
+                limiter.wake()
+            logger.error(f"Attempt {attempt}/{retries} failed for {key} [{kind}]: {e}")
+
+            if on_error:
+                on_error(e, attempt)
+
+            if kind == FATAL or attempt == retries:
+                raise
+
+            llm_retries.inc(provider=provider, op=op, kind=kind)
+            delay = retry_delay(e, kind, attempt)
+            logger.info(f"Retrying {key} in {delay:.1f} seconds...")
+            wait(delay, breaker)
+            continue
+
+        llm_inflight.dec(provider=provider)
+        llm_request_seconds.observe(time.monotonic() - started, provider=provider,
+                                    model=model_name(), op=op, outcome="ok")
+        limiter.release(started, OK, until=calls[0])
+        breaker.record_success()
+        return result
@@ -1,96 +1,244 @@
 
 from pathlib import Path
-import json
-import re
 import hashlib
-from bs4 import BeautifulSoup
+import re
+import zlib
+import base64
+from collections import OrderedDict
+from threading import Lock, RLock
+from lxml import etree, html as lxml_html
 from rapidfuzz.fuzz import ratio
+from .journal import JsonlJournal
+from .metrics import similarity_lookups
 
 
-DB_FILE = Path("temp/processed_blocks.json")
+DB_FILE = Path("temp/processed_blocks.jsonl")
+processed_journal = JsonlJournal(DB_FILE, key=lambda item: item["hash"])
 
-def html_skeleton(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
+FINGERPRINT_CACHE_SIZE = 4096
 
-    for tag in soup(["script", "style"]):
-        tag.decompose()
+# MinHash/LSH over skeleton shingles: SKETCH_BINS one-permutation minimums,
+# banded SKETCH_ROWS at a time. Two skeletons share a band with probability
+# ~0.9 at a shingle Jaccard of 0.6, ~0.3 at 0.4
+SKETCH_BINS = 64
+SKETCH_ROWS = 4
+SHINGLE_TAGS = 2
+_TAG = re.compile(r"<[^>]*>")
+_fingerprints = OrderedDict()
+_fingerprints_lock = Lock()
 
-    for tag in soup.find_all():
-        if tag.string:
-            tag.string.replace_with("")
 
-    for tag in soup.find_all():
-        for attr in ["id", "style", "data-id"]:
-            if attr in tag.attrs:
-                del tag.attrs[attr]
+def _build_skeleton(html: str) -> str:
+    try:
+        root = lxml_html.fragment_fromstring(html, create_parent="div")
+    except (etree.ParserError, ValueError):
+        return ""
 
-    skeleton = str(soup)
-    skeleton = re.sub(r"\s+", " ", skeleton).strip()
+    parts = []
+    walker = etree.iterwalk(root, events=("start", "end"))
+    for event, el in walker:
+        tag = el.tag
+        if el is root or not isinstance(tag, str):
+            continue
 
-    return skeleton
+        if tag in ("script", "style"):
+            if event == "start":
+                walker.skip_subtree()
+            continue
 
+        if event == "end":
+            parts.append(f"</{tag}>")
+            continue
 
-def skeleton_hash(html: str) -> str:
-    skel = html_skeleton(html)
-    return hashlib.sha256(skel.encode()).hexdigest()
+        classes = " ".join((el.get("class") or "").split())
+        if classes:
+            parts.append(f'<{tag} class="{classes}">')
+        else:
+            parts.append(f"<{tag}>")
 
-def load_db():
-    if not DB_FILE.exists():
-        DB_FILE.write_text("[]", encoding="utf-8")
+    return "".join(parts)
 
-        return []
 
-    try:
-        content = DB_FILE.read_text(encoding="utf-8").strip()
+def fingerprint(html: str) -> tuple[str, str]:
+    """
+    (skeleton, skeleton sha256) of a component in one lxml pass.
 
-        # Handle empty file case
-        if not content:
-            DB_FILE.write_text("[]", encoding="utf-8")
-            return []
+    The skeleton keeps only tags and normalized classes; text, ids, other
+    attributes and script/style are dropped. Results are memoized by a
+    digest of the raw HTML, so the lookups and marks done for the same
+    component only parse it once.
+    """
+    digest = hashlib.blake2b(html.encode("utf-8"), digest_size=16).digest()
 
-        return json.loads(content)
+    with _fingerprints_lock:
+        cached = _fingerprints.get(digest)
+        if cached is not None:
+            _fingerprints.move_to_end(digest)
+            return cached
 
-    except json.JSONDecodeError:
-        # Reset corrupted DB
-        DB_FILE.write_text("[]", encoding="utf-8")
-        return []
+    skel = _build_skeleton(html)
+    result = (skel, hashlib.sha256(skel.encode()).hexdigest())
 
-def save_db(data):
-    DB_FILE.write_text(
-        json.dumps(data, indent=2, ensure_ascii=False),
-        encoding="utf-8"
-    )
+    with _fingerprints_lock:
+        _fingerprints[digest] = result
+        if len(_fingerprints) > FINGERPRINT_CACHE_SIZE:
+            _fingerprints.popitem(last=False)
 
-def mark_as_processed(name: str, html: str,shortcode_data: dict):
-    db = load_db()
+    return result
 
-    skel = html_skeleton(html)
-    h = skeleton_hash(html)
 
-    db.append({
-        "name": name,
-        "hash": h,
-        "skeleton": skel,
-        "shortcode": shortcode_data  
-    })
+def html_skeleton(html: str) -> str:
+    return fingerprint(html)[0]
 
-    save_db(db)
 
-from rapidfuzz.fuzz import ratio
+def skeleton_hash(html: str) -> str:
+    return fingerprint(html)[1]
+
+def load_db():
+    return processed_journal.read()
+
+def compress_skeleton(skel: str) -> str:
+    return base64.b64encode(zlib.compress(skel.encode("utf-8"), 6)).decode("ascii")
+
+
+def decompress_skeleton(item: dict) -> str:
+    if "skeleton_z" in item:
+        return zlib.decompress(base64.b64decode(item["skeleton_z"])).decode("utf-8")
+    return item.get("skeleton", "")
+
+
+def lsh_bands(skel: str) -> list:
+    """
+    LSH bucket keys of a skeleton: a one-permutation MinHash over its
+    shingles of SHINGLE_TAGS consecutive tags, cut into bands. An empty bin
+    borrows the next filled one (densification), so small skeletons don't
+    all land in the same all-empty buckets. The keys use hash(), they
+    only live as long as the in-memory index.
+    """
+    tags = _TAG.findall(skel)
+    mins = [None] * SKETCH_BINS
+    for i in range(max(1, len(tags) - SHINGLE_TAGS + 1)):
+        h = hash("".join(tags[i:i + SHINGLE_TAGS])) & 0xFFFFFFFFFFFF
+        b, value = h % SKETCH_BINS, h // SKETCH_BINS
+        if mins[b] is None or value < mins[b]:
+            mins[b] = value
+
+    if mins.count(None) == SKETCH_BINS:
+        return []
+    filled = list(mins)
+    for b in range(SKETCH_BINS):
+        step = 1
+        while filled[b] is None:
+            if mins[(b + step) % SKETCH_BINS] is not None:
+                filled[b] = (mins[(b + step) % SKETCH_BINS], step)
+            step += 1
+
+    return [(start, tuple(filled[start:start + SKETCH_ROWS]))
+            for start in range(0, SKETCH_BINS, SKETCH_ROWS)]
+
+
+class SimilarityIndex:
+    """
+    In-memory index over the processed_blocks journal, loaded once per run.
+
+    Exact skeleton hashes are a dict lookup. For fuzzy matches only the
+    skeletons sharing an LSH band with the new one (lsh_bands) are
+    candidates; the buckets are kept up to date on add, so a lookup never
+    walks the whole store. Candidates are scored band by band, so the
+    ones sharing the first bands come first, and the first scoring at
+    least threshold is the match. Those whose length can't reach the
+    threshold are skipped unscored: fuzz.ratio = 2*M / (len_a + len_b) * 100
+    with M <= min(len_a, len_b), so a score >= t needs min/max >= t / (200 - t).
+    """
+
+    def __init__(self, db_file: Path):
+        self.db_file = db_file
+        self.lock = RLock()
+        self.items = None
+        self.by_hash = {}
+        self.skeletons = []
+        self.buckets = {}
+
+    def _ensure_loaded(self):
+        # temp/ is wiped after every run; drop the in-memory copy with it
+        if self.items is not None and (self.items == [] or self.db_file.exists()):
+            return
+
+        self.items = []
+        self.by_hash = {}
+        self.skeletons = []
+        self.buckets = {}
+        for item in load_db():
+            self._add(item, decompress_skeleton(item))
+
+    def _add(self, item: dict, skel: str):
+        idx = len(self.items)
+        self.items.append(item)
+        self.skeletons.append(skel)
+        if item["hash"] in self.by_hash:
+            return
+        self.by_hash[item["hash"]] = idx
+        for band in lsh_bands(skel):
+            self.buckets.setdefault(band, []).append(idx)
+
+    def add(self, item: dict, skel: str):
+        with self.lock:
+            self._ensure_loaded()
+            self._add(item, skel)
+
+    def find(self, skel: str, h: str, threshold=95):
+        with self.lock:
+            self._ensure_loaded()
+
+            idx = self.by_hash.get(h)
+            if idx is not None:
+                return True, self.items[idx], 100
+
+            if not self.items:
+                return False, None, None
+
+            factor = max(threshold, 1) / (200 - min(threshold, 100))
+            shortest, longest = len(skel) * factor, len(skel) / factor
+
+            seen = set()
+            for band in lsh_bands(skel):
+                for idx in self.buckets.get(band, ()):
+                    if idx in seen:
+                        continue
+                    seen.add(idx)
+
+                    other = self.skeletons[idx]
+                    if not shortest <= len(other) <= longest:
+                        continue
+                    score = ratio(skel, other, score_cutoff=threshold)
+                    if score:
+                        return True, self.items[idx], score
+
+            return False, None, None
+
+
+processed_index = SimilarityIndex(DB_FILE)
+
 
-def is_already_processed(new_html: str, threshold=95):
-    db = load_db()
+def mark_as_processed(name: str, html: str,shortcode_data: dict):
+    skel, h = fingerprint(html)
 
-    new_skel = html_skeleton(new_html)
-    new_hash = skeleton_hash(new_html)
+    item = {
+        "name": name,
+        "hash": h,
+        "skeleton_z": compress_skeleton(skel),
+        "shortcode": shortcode_data  
+    }
 
-    for item in db:
-        if item["hash"] == new_hash:
-            return True, item, 100
+    with processed_index.lock:
+        processed_index.add(item, skel)
+        processed_journal.append(item)
 
-        score = ratio(new_skel, item["skeleton"])
-        if score >= threshold:
-            return True, item, score
 
-    return False, None, None
+def is_already_processed(new_html: str, threshold=95, record=True):
+    new_skel, new_hash = fingerprint(new_html)
 
+    result = processed_index.find(new_skel, new_hash, threshold)
+    if record:
+        similarity_lookups.inc(result="hit" if result[0] else "miss")
+    return result
@@ -0,0 +1,65 @@
+import contextvars
+import itertools
+import threading
+from concurrent.futures import Future
+from queue import PriorityQueue
+from .logger import logger
+
+
+class LLMScheduler:
+    """
+    Process-wide work queue for LLM calls, shared by every page.
+
+    A fixed window of worker threads keeps up to max_inflight requests
+    running; as soon as one returns the worker pulls the next job, so a
+    slow call only holds its own slot. Jobs with a higher priority (the
+    larger components) are started first, ties go in submission order.
+    """
+
+    def __init__(self, max_inflight: int, name: str = "llm"):
+        self.max_inflight = max(1, int(max_inflight))
+        self.name = name
+        self.queue = PriorityQueue()
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.workers = []
+
+    def _start(self):
+        with self.lock:
+            if self.workers:
+                return
+
+            for n in range(self.max_inflight):
+                t = threading.Thread(
+                    target=self._worker,
+                    name=f"{self.name}-slot-{n}",
+                    daemon=True
+                )
+                t.start()
+                self.workers.append(t)
+
+            logger.info(f"[{self.name}] scheduler started: {self.max_inflight} slots")
+
+    def _worker(self):
+        while True:
+            _, _, ctx, fn, args, kwargs, future = self.queue.get()
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                future.set_result(ctx.run(fn, *args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def submit(self, fn, *args, priority: int = 0, **kwargs) -> Future:
+        self._start()
+
+        future = Future()
+        # slots are shared by every job; run the call in its submitter's context
+        ctx = contextvars.copy_context()
+        self.queue.put((-priority, next(self.counter), ctx, fn, args, kwargs, future))
+        return future
+
+    def pending(self) -> int:
+        return self.queue.qsize()
@@ -10,4 +10,7 @@ class ShortcodeSchema(BaseModel):
 
 class ReadmeMetadata(BaseModel):
     description: str
-    tags: List[str]
\ No newline at end of file
+    tags: List[str]
+
+class ShortcodeBatchSchema(BaseModel):
+    shortcodes: List[ShortcodeSchema]
@@ -0,0 +1,87 @@
+import asyncio
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from PIL import Image
+from .browser import browser_pool, open_when_ready
+from .logger import logger
+
+# name:WIDTHxHEIGHT, the first one is also saved as screenshot.webp
+SCREENSHOT_VIEWPORTS = os.getenv(
+    "SCREENSHOT_VIEWPORTS", "desktop:1280x720,tablet:768x1024,mobile:375x812"
+)
+SCREENSHOT_FULL_PAGE = os.getenv("SCREENSHOT_FULL_PAGE", "0") == "1"
+SCREENSHOT_THUMB_WIDTH = int(os.getenv("SCREENSHOT_THUMB_WIDTH", "400"))
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", "85"))
+
+# Pillow releases the GIL while encoding, threads are enough
+_encoder = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SCREENSHOT_WORKERS", "4")), thread_name_prefix="webp"
+)
+
+
+def parse_viewports(spec: str) -> list:
+    viewports = []
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, size = item.strip().split(":")
+        width, height = size.lower().split("x")
+        viewports.append((name, {"width": int(width), "height": int(height)}))
+    return viewports
+
+
+def encode_webp(png: bytes, path: Path, thumb_width: int = SCREENSHOT_THUMB_WIDTH):
+    """Save the PNG bytes as path (WebP) and a thumbnail next to it"""
+    img = Image.open(io.BytesIO(png))
+    img.save(path, "webp", quality=WEBP_QUALITY)
+
+    if thumb_width:
+        thumb_width = min(thumb_width, img.width)
+        # full-page shots are tall; the thumbnail keeps the top of the page
+        height = round(img.height * thumb_width / img.width)
+        thumb = img.resize((thumb_width, height), Image.LANCZOS)
+        thumb = thumb.crop((0, 0, thumb_width, min(height, thumb_width * 2)))
+        thumb.save(path.with_name(f"{path.stem}-thumb.webp"), "webp", quality=WEBP_QUALITY)
+    return path
+
+
+async def _capture(context, url: str, name: str, viewport: dict, folder: Path,
+                   full_page: bool) -> list:
+    page = await context.new_page()
+    await page.set_viewport_size(viewport)
+    await open_when_ready(page, url)
+
+    shots = [(name, await page.screenshot(type="png"))]
+    if full_page:
+        shots.append((f"{name}-full", await page.screenshot(type="png", full_page=True)))
+    await page.close()
+
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*(
+        loop.run_in_executor(_encoder, encode_webp, png, folder / f"{shot}.webp")
+        for shot, png in shots
+    ))
+
+
+async def capture_screenshots(url: str, folder: Path, viewports=None,
+                              full_page: bool = SCREENSHOT_FULL_PAGE) -> list:
+    """
+    Screenshot url at every viewport at once, one page each in a shared
+    browser context, and save <name>.webp and <name>-thumb.webp into folder.
+    The full-page shot, if wanted, is taken on the first viewport.
+    """
+    viewports = viewports or parse_viewports(SCREENSHOT_VIEWPORTS)
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+
+    async with browser_pool.context() as context:
+        results = await asyncio.gather(*(
+            _capture(context, url, name, viewport, folder, full_page and i == 0)
+            for i, (name, viewport) in enumerate(viewports)
+        ))
+
+    paths = [path for shots in results for path in shots]
+    logger.info(f"{len(paths)} screenshot(s) saved in {folder}")
+    return paths
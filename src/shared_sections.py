@@ -0,0 +1,195 @@
+import json
+import math
+import os
+from concurrent.futures import Future
+from threading import Lock
+from bs4 import BeautifulSoup
+from .logger import logger
+from .save_shortcode import fingerprint
+
+DETECT_SHARED = os.getenv("DETECT_SHARED_SECTIONS", "1") == "1"
+SHARED_MIN_RATIO = float(os.getenv("SHARED_MIN_RATIO", "0.5"))
+SHARED_MAX_DEPTH = int(os.getenv("SHARED_MAX_DEPTH", "4"))
+SHARED_MIN_CHARS = int(os.getenv("SHARED_MIN_CHARS", "200"))
+
+# a shared block inside one of these belongs to that section (the top bar of
+# a header that differs per page only by its active nav item)
+SECTION_TAGS = {"header", "footer", "nav", "section", "aside", "article"}
+
+
+def load_body(html_path):
+    with open(html_path, "r", encoding="utf-8") as f:
+        soup = BeautifulSoup(f.read(), "html.parser")
+
+    body = soup.find("body")
+    if body:
+        for script in body.find_all("script"):
+            script.decompose()
+
+    return soup, body
+
+
+def subtree_hash(el):
+    html = str(el)
+    if len(html) < SHARED_MIN_CHARS:
+        return None
+    return fingerprint(html)[1]
+
+
+def page_hashes(body, max_depth=SHARED_MAX_DEPTH) -> set:
+    hashes = set()
+
+    def visit(el, depth):
+        for child in el.find_all(True, recursive=False):
+            h = subtree_hash(child)
+            if h:
+                hashes.add(h)
+            if depth < max_depth:
+                visit(child, depth + 1)
+
+    visit(body, 1)
+    return hashes
+
+
+def top_shared_nodes(body, hashes, max_depth=SHARED_MAX_DEPTH) -> list:
+    """
+    Outermost elements under body whose structural hash is shared, looking
+    through wrappers but not into unshared sections (SECTION_TAGS)
+    """
+    found = []
+
+    def visit(el, depth):
+        for child in el.find_all(True, recursive=False):
+            if subtree_hash(child) in hashes:
+                found.append(child)
+            elif depth < max_depth and child.name not in SECTION_TAGS:
+                visit(child, depth + 1)
+
+    visit(body, 1)
+    return found
+
+
+class SharedSections:
+    """
+    Subtrees (header, footer, offcanvas menus, modals...) repeated across
+    the pages of one theme, identified by structural hash.
+
+    They are analyzed once from a synthetic body and stripped from every
+    page before its own analysis; their selector entries are merged back
+    into each page config afterwards.
+    """
+
+    def __init__(self, hashes: set, html: str, pages: int):
+        self.hashes = hashes
+        self.html = html
+        self.pages = pages
+        self.lock = Lock()
+        self._future = None
+
+    def strip(self, body) -> int:
+        nodes = top_shared_nodes(body, self.hashes)
+        for node in nodes:
+            node.decompose()
+        return len(nodes)
+
+    def analyze(self, analyze_fn):
+        """
+        Selector entries for the shared subtrees, computed by
+        analyze_fn(html) once; concurrent callers wait for the first one.
+        Returns None when the shared analysis failed.
+        """
+        with self.lock:
+            owner = self._future is None
+            if owner:
+                self._future = Future()
+
+        if owner:
+            try:
+                config = json.loads(analyze_fn(self.html))
+                if not isinstance(config, list):
+                    raise ValueError("shared analysis is not a JSON array")
+                self._future.set_result(config)
+            except Exception as e:
+                logger.error(f"Shared sections analysis failed: {e}")
+                self._future.set_result(None)
+
+        return self._future.result()
+
+
+def find_shared_sections(html_paths: list):
+    """Pre-pass over all pages of a theme; None when nothing is shared"""
+    if not DETECT_SHARED or len(html_paths) < 2:
+        return None
+
+    bodies = []
+    counts = {}
+    for path in html_paths:
+        _, body = load_body(path)
+        if not body:
+            continue
+        bodies.append(body)
+        for h in page_hashes(body):
+            counts[h] = counts.get(h, 0) + 1
+
+    min_pages = max(2, math.ceil(SHARED_MIN_RATIO * len(bodies)))
+    hashes = {h for h, n in counts.items() if n >= min_pages}
+    if not hashes:
+        logger.info("No sections shared across pages")
+        return None
+
+    # one copy of every shared subtree, in the order pages show them
+    blocks = {}
+    for body in bodies:
+        for node in top_shared_nodes(body, hashes):
+            blocks.setdefault(subtree_hash(node), str(node))
+
+    html = "<body>\n" + "\n".join(blocks.values()) + "\n</body>"
+    logger.info(
+        f"Found {len(blocks)} sections shared by at least {min_pages}/"
+        f"{len(bodies)} pages"
+    )
+
+    return SharedSections(set(blocks), html, len(bodies))
+
+
+def merge_configs(unique: list, shared: list, html_path) -> list:
+    """
+    Page config = its own entries + the shared ones that resolve on it,
+    ordered by where each selector lands in the page (top to bottom).
+    An entry nested in another entry's element is dropped when either of
+    them is shared, so no block is extracted twice.
+    """
+    with open(html_path, "r", encoding="utf-8") as f:
+        soup = BeautifulSoup(f.read(), "html.parser")
+    position = {id(el): i for i, el in enumerate(soup.find_all(True))}
+
+    merged = []
+    seen = set()
+    for source, entries in (("page", unique), ("shared", shared)):
+        for entry in entries:
+            selector = entry.get("selector")
+            if not selector or selector in seen:
+                continue
+
+            try:
+                el = soup.select_one(selector)
+            except Exception:
+                el = None
+
+            if el is None and source == "shared":
+                continue
+
+            seen.add(selector)
+            merged.append((position.get(id(el), len(position)), el, source, entry))
+
+    sources = {id(el): source for _, el, source, _ in merged if el is not None}
+    kept = []
+    for pos, el, source, entry in merged:
+        outer = [sources[id(p)] for p in (el.parents if el is not None else ()) if id(p) in sources]
+        if outer and (source == "shared" or "shared" in outer):
+            logger.info(f"Dropping {entry.get('selector')}: nested in another section")
+            continue
+        kept.append((pos, entry))
+
+    kept.sort(key=lambda x: x[0])
+    return [entry for _, entry in kept]
@@ -0,0 +1,52 @@
+import time
+from contextlib import contextmanager
+from threading import Lock
+from .logger import logger
+from .tracing import span
+from .profiling import profile_stage
+from .metrics import stage_seconds
+
+_stages = {}
+_lock = Lock()
+
+
+def record_stage(name: str, seconds: float):
+    with _lock:
+        entry = _stages.setdefault(name, {"calls": 0, "seconds": 0.0, "max": 0.0})
+        entry["calls"] += 1
+        entry["seconds"] += seconds
+        entry["max"] = max(entry["max"], seconds)
+    stage_seconds.observe(seconds, stage=name)
+
+
+@contextmanager
+def stage(name: str, **attrs):
+    """
+    Time a block of work under name, and trace it as a span tagged with
+    attrs. Totals are summed per name, so for pipeline stages running on
+    several threads "seconds" is busy time, not wall time.
+    """
+    started = time.perf_counter()
+    try:
+        with span(name, "stage", **attrs), profile_stage(name):
+            yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def stage_stats() -> dict:
+    with _lock:
+        return {name: dict(entry) for name, entry in _stages.items()}
+
+
+def reset_stage_stats():
+    with _lock:
+        _stages.clear()
+
+
+def log_stage_stats():
+    for name, entry in stage_stats().items():
+        logger.info(
+            f"Stage {name}: {entry['seconds']:.2f}s over {entry['calls']} call(s), "
+            f"max {entry['max']:.2f}s"
+        )
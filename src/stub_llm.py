@@ -0,0 +1,398 @@
+"""
+Local stand-in for the OpenAI/NVIDIA chat-completions API.
+
+    python -m src.stub_llm
+    NVIDIA_BASE_URL = http://localhost:8001/v1   (in the converter's .env)
+
+Answers analysis, navigation, readme and shortcode requests with JSON the
+pipeline accepts, with configurable latency and failure rates, so retry,
+limiter and thread pool behaviour can be measured without spending tokens.
+GET /stats returns request/fault counters, POST /reset clears them.
+"""
+import json
+import math
+import os
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from bs4 import BeautifulSoup
+from dotenv import load_dotenv
+from .logger import logger
+
+load_dotenv()
+
+STUB_HOST = os.getenv("STUB_LLM_HOST", "localhost")
+STUB_PORT = int(os.getenv("STUB_LLM_PORT", "8001"))
+# lognormal latency: median seconds and spread
+STUB_LATENCY_MEDIAN = float(os.getenv("STUB_LATENCY_MEDIAN", "1.0"))
+STUB_LATENCY_SIGMA = float(os.getenv("STUB_LATENCY_SIGMA", "0.5"))
+# probability of each fault per request
+STUB_RATE_429 = float(os.getenv("STUB_RATE_429", "0"))
+STUB_RATE_500 = float(os.getenv("STUB_RATE_500", "0"))
+STUB_RATE_EMPTY = float(os.getenv("STUB_RATE_EMPTY", "0"))
+STUB_RATE_MALFORMED = float(os.getenv("STUB_RATE_MALFORMED", "0"))
+STUB_RETRY_AFTER = os.getenv("STUB_RETRY_AFTER", "1")
+STUB_SEED = os.getenv("STUB_SEED")
+
+PARTIAL_TAGS = {"header", "footer", "nav", "aside"}
+# opening line of prompt/config_prompt.md, tells menu requests from page analysis
+NAVIGATION_MARKER = "navigation extractor"
+
+
+class StubConfig:
+    def __init__(self, latency_median=STUB_LATENCY_MEDIAN,
+                 latency_sigma=STUB_LATENCY_SIGMA,
+                 rate_429=STUB_RATE_429, rate_500=STUB_RATE_500,
+                 rate_empty=STUB_RATE_EMPTY, rate_malformed=STUB_RATE_MALFORMED,
+                 retry_after=STUB_RETRY_AFTER, seed=STUB_SEED,
+                 models=None):
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.rate_empty = rate_empty
+        self.rate_malformed = rate_malformed
+        self.retry_after = retry_after
+        self.models = models or [os.getenv("MODEL_NAME") or "stub-model"]
+        self.random = random.Random(seed)
+        self.lock = Lock()
+
+    def roll(self, rate: float) -> bool:
+        with self.lock:
+            return rate > 0 and self.random.random() < rate
+
+    def latency(self) -> float:
+        if self.latency_median <= 0:
+            return 0.0
+        with self.lock:
+            return self.latency_median * math.exp(self.random.gauss(0, self.latency_sigma))
+
+
+class StubStats:
+    def __init__(self):
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts = {}
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+
+    def add(self, name: str, prompt_tokens=0, completion_tokens=0):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "counts": dict(self.counts),
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+            }
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def message_text(message) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def structured_schema(payload: dict):
+    """JSON schema the client asked the output to follow, if any"""
+    if "guided_json" in payload:
+        return payload["guided_json"]
+
+    nvext = payload.get("nvext") or {}
+    if "guided_json" in nvext:
+        return nvext["guided_json"]
+
+    response_format = payload.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return response_format["json_schema"].get("schema")
+
+    return None
+
+
+def kebab(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-") or "section"
+
+
+def css_path(el) -> str:
+    parts = []
+    while el is not None and el.name not in ("body", "[document]"):
+        index = 1 + sum(1 for s in el.find_previous_siblings(el.name))
+        parts.append(f"{el.name}:nth-of-type({index})")
+        el = el.parent
+    return "body > " + " > ".join(reversed(parts))
+
+
+def element_selector(el, soup) -> str:
+    selector = el.name
+    if el.get("id"):
+        selector += f"#{el['id']}"
+    elif el.get("class"):
+        selector += "".join(f".{c}" for c in el["class"])
+
+    try:
+        if len(soup.select(selector)) == 1:
+            return selector
+    except Exception:
+        pass
+    return css_path(el)
+
+
+def analysis_response(html: str) -> list:
+    soup = BeautifulSoup(html, "html.parser")
+    root = soup.find("body") or soup
+
+    # descend through single wrappers like <div class="page-wrapper">
+    children = root.find_all(True, recursive=False)
+    while len(children) == 1 and children[0].name not in PARTIAL_TAGS:
+        root = children[0]
+        children = root.find_all(True, recursive=False)
+
+    entries = []
+    names = set()
+    for el in children:
+        if el.name in ("script", "style", "link", "meta"):
+            continue
+
+        name = kebab(el.get("id") or " ".join(el.get("class") or []) or el.name)
+        base, n = name, 2
+        while name in names:
+            name, n = f"{base}-{n}", n + 1
+        names.add(name)
+
+        entries.append({
+            "selector": element_selector(el, soup),
+            "type": "partial" if el.name in PARTIAL_TAGS else "shortcode",
+            "name": name,
+        })
+    return entries
+
+
+def navigation_response(html: str) -> list:
+    soup = BeautifulSoup(html, "html.parser")
+    menus = []
+    for i, nav in enumerate(soup.find_all("nav")):
+        label = nav.get("aria-label") or " ".join(nav.get("class") or []) or f"menu {i + 1}"
+        menus.append({"id": kebab(label), "name": label.title(), "type": "both"})
+    return menus or [{"id": "main-menu", "name": "Main Menu", "type": "both"}]
+
+
+def components_in(text: str) -> list:
+    """(key, component data) pairs of a shortcode or packed request"""
+    found = []
+    for match in re.finditer(r"Component Key:\s*(\S+)\s*Component Data:\s*", text):
+        try:
+            data, _ = json.JSONDecoder().raw_decode(text[match.end():])
+        except ValueError:
+            data = {}
+        found.append((match.group(1), data if isinstance(data, dict) else {}))
+    return found
+
+
+def shortcode_response(key: str, data: dict) -> dict:
+    return {
+        "name": key,
+        "param": [],
+        "template": data.get("html") or f"<div class=\"{key}\"></div>",
+        "queryScript": "",
+    }
+
+
+def fill_schema(schema: dict, defs: dict):
+    """Minimal instance of a JSON schema"""
+    if "$ref" in schema:
+        return fill_schema(defs.get(schema["$ref"].split("/")[-1], {}), defs)
+    for key in ("anyOf", "oneOf", "allOf"):
+        if schema.get(key):
+            return fill_schema(schema[key][0], defs)
+    if "enum" in schema:
+        return schema["enum"][0]
+
+    kind = schema.get("type", "object")
+    if kind == "object":
+        return {
+            name: fill_schema(prop, defs)
+            for name, prop in (schema.get("properties") or {}).items()
+        }
+    if kind == "array":
+        return [fill_schema(schema.get("items") or {"type": "string"}, defs)]
+    if kind == "integer":
+        return 0
+    if kind == "number":
+        return 0.0
+    if kind == "boolean":
+        return False
+    return "stub"
+
+
+def structured_response(schema: dict, text: str):
+    properties = set(schema.get("properties") or {})
+    components = components_in(text)
+
+    if properties == {"shortcodes"}:
+        return {"shortcodes": [shortcode_response(k, d) for k, d in components]}
+    if {"name", "template", "queryScript"} <= properties and components:
+        return shortcode_response(*components[0])
+    if properties == {"description", "tags"}:
+        return {
+            "description": "A clean, responsive design for modern sites, ready to use with Foduu Studio.",
+            "tags": ["responsive", "modern", "business", "clean"],
+        }
+    return fill_schema(schema, schema.get("$defs") or schema.get("definitions") or {})
+
+
+def html_block(text: str) -> str:
+    match = re.search(r"```html\s*(.*?)```", text, re.DOTALL)
+    return match.group(1) if match else text
+
+
+def completion_content(payload: dict) -> tuple:
+    """(kind, JSON text) answering one chat-completions request"""
+    messages = payload.get("messages") or []
+    system = " ".join(message_text(m) for m in messages if m.get("role") == "system")
+    user = message_text(messages[-1]) if messages else ""
+
+    schema = structured_schema(payload)
+    if schema:
+        kind = "structured"
+        data = structured_response(schema, user)
+    elif NAVIGATION_MARKER in system.lower():
+        kind = "navigation"
+        data = navigation_response(html_block(user))
+    elif "```html" in user:
+        kind = "analysis"
+        data = analysis_response(html_block(user))
+    else:
+        kind = "text"
+        data = {}
+
+    return kind, json.dumps(data, ensure_ascii=False)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    config: StubConfig = None
+    stats: StubStats = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, data, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self.send_json(200, {
+                "object": "list",
+                "data": [
+                    {"id": m, "object": "model", "created": 0, "owned_by": "stub"}
+                    for m in self.config.models
+                ],
+            })
+        elif self.path.rstrip("/").endswith("/stats"):
+            self.send_json(200, self.stats.snapshot())
+        else:
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+
+        if self.path.rstrip("/").endswith("/reset"):
+            self.stats.reset()
+            self.send_json(200, {"ok": True})
+            return
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        try:
+            payload = json.loads(raw or b"{}")
+        except ValueError:
+            self.send_json(400, {"error": {"message": "Invalid JSON body"}})
+            return
+
+        config = self.config
+        time.sleep(config.latency())
+
+        if config.roll(config.rate_429):
+            self.stats.add("fault_429")
+            self.send_json(429, {"error": {"message": "Too Many Requests"}},
+                           {"Retry-After": config.retry_after})
+            return
+
+        if config.roll(config.rate_500):
+            self.stats.add("fault_500")
+            self.send_json(500, {"error": {"message": "Internal Server Error"}})
+            return
+
+        kind, content = completion_content(payload)
+        if config.roll(config.rate_empty):
+            kind, content = "fault_empty", ""
+        elif config.roll(config.rate_malformed):
+            kind, content = "fault_malformed", content[: max(1, len(content) // 2)]
+
+        prompt_tokens = sum(estimate_tokens(message_text(m)) for m in payload.get("messages") or [])
+        completion_tokens = estimate_tokens(content)
+        self.stats.add(kind, prompt_tokens, completion_tokens)
+
+        self.send_json(200, {
+            "id": f"chatcmpl-stub-{time.monotonic_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model") or config.models[0],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+
+def start_stub_server(host=STUB_HOST, port=STUB_PORT, config: StubConfig = None):
+    """Serve in a background thread; returns (server, base_url). port=0 picks a free port."""
+    handler = type("Handler", (StubHandler,), {
+        "config": config or StubConfig(),
+        "stats": StubStats(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True, name="stub-llm").start()
+
+    base_url = f"http://{host}:{server.server_address[1]}/v1"
+    logger.info(f"Stub LLM server listening on {base_url}")
+    return server, base_url
+
+
+if __name__ == "__main__":
+    server, base_url = start_stub_server()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
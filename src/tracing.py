@@ -0,0 +1,220 @@
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+from .logger import logger
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") == "1"
+# OTLP/HTTP collector, e.g. http://localhost:4318 (spans POSTed to /v1/traces)
+OTLP_ENDPOINT = os.getenv("OTLP_ENDPOINT", "")
+OTLP_SERVICE_NAME = os.getenv("OTLP_SERVICE_NAME", "template-converter")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+# per job: each request/asyncio.run() has its own context, worker threads get a copy
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Span:
+    def __init__(self, trace, name: str, cat: str, attrs: dict):
+        self.trace = trace
+        self.name = name
+        self.cat = cat
+        self.attrs = attrs
+        self.span_id = secrets.token_hex(8)
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent else None
+        self.thread = threading.current_thread()
+        self.start = time.perf_counter_ns()
+        self.end = None
+        self.error = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, **values):
+        """Sum numeric attributes (tokens of retries and hedged duplicates)"""
+        for key, value in values.items():
+            self.attrs[key] = self.attrs.get(key, 0) + (value or 0)
+
+
+class Trace:
+    """
+    Spans of one conversion job, exported as a Chrome trace (load it in
+    chrome://tracing or ui.perfetto.dev) and optionally to an OTLP collector.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = secrets.token_hex(16)
+        self.spans = []
+        self.lock = Lock()
+        self.started_ns = time.perf_counter_ns()
+        self.started_unix_ns = time.time_ns()
+
+    def record(self, span: Span):
+        with self.lock:
+            self.spans.append(span)
+
+    def to_chrome(self) -> dict:
+        pid = os.getpid()
+        events = []
+        threads = {}
+
+        with self.lock:
+            spans = list(self.spans)
+
+        for span in spans:
+            tid = span.thread.ident or 0
+            threads[tid] = span.thread.name
+            args = {k: _jsonable(v) for k, v in span.attrs.items()}
+            args["thread"] = span.thread.name
+            if span.error:
+                args["error"] = span.error
+            events.append({
+                "name": span.name,
+                "cat": span.cat,
+                "ph": "X",
+                "ts": (span.start - self.started_ns) / 1000,
+                "dur": (span.end - span.start) / 1000,
+                "pid": pid,
+                "tid": tid,
+                "args": args,
+            })
+
+        events.extend(
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        )
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"job": self.name, "trace_id": self.trace_id},
+        }
+
+    def to_otlp(self) -> dict:
+        def unix_ns(t):
+            return str(self.started_unix_ns + t - self.started_ns)
+
+        with self.lock:
+            spans = list(self.spans)
+
+        return {"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({
+                "service.name": OTLP_SERVICE_NAME,
+                "job": self.name,
+            })},
+            "scopeSpans": [{
+                "scope": {"name": "src.tracing"},
+                "spans": [
+                    {
+                        "traceId": self.trace_id,
+                        "spanId": span.span_id,
+                        **({"parentSpanId": span.parent_id} if span.parent_id else {}),
+                        "name": span.name,
+                        "kind": 1,
+                        "startTimeUnixNano": unix_ns(span.start),
+                        "endTimeUnixNano": unix_ns(span.end),
+                        "attributes": _otlp_attributes({
+                            **span.attrs,
+                            "category": span.cat,
+                            "thread.name": span.thread.name,
+                        }),
+                        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+                    }
+                    for span in spans
+                ],
+            }],
+        }]}
+
+
+def _jsonable(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def _otlp_attributes(attrs: dict) -> list:
+    result = []
+    for key, value in attrs.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        result.append({"key": key, "value": typed})
+    return result
+
+
+def start_trace(name: str):
+    """
+    Begin collecting spans for the job running in the current context; a
+    no-op when TRACE_ENABLED=0. Concurrent jobs each get their own trace.
+    """
+    trace = Trace(name) if TRACE_ENABLED else None
+    _current_trace.set(trace)
+    return trace
+
+
+def finish_trace(path: Path):
+    """Write the Chrome trace to path (and send it to OTLP_ENDPOINT if set)"""
+    trace = _current_trace.get()
+    _current_trace.set(None)
+    if trace is None:
+        return None
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(trace.to_chrome()), encoding="utf-8")
+    logger.info(f"Trace with {len(trace.spans)} spans saved: {path}")
+
+    if OTLP_ENDPOINT:
+        try:
+            request = urllib.request.Request(
+                OTLP_ENDPOINT.rstrip("/") + "/v1/traces",
+                data=json.dumps(trace.to_otlp()).encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            urllib.request.urlopen(request, timeout=10).close()
+        except Exception as e:
+            logger.warning(f"OTLP export to {OTLP_ENDPOINT} failed: {e}")
+
+    return path
+
+
+@contextmanager
+def span(name: str, cat: str = "stage", **attrs):
+    """
+    Record a span around the block. Spans opened inside it on the same
+    thread (or in work submitted with a copied context) become children.
+    Threads must run with the job's context for their spans to be kept.
+    """
+    trace = _current_trace.get()
+    current = Span(trace, name, cat, attrs)
+    if trace is None:
+        yield current
+        return
+
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end = time.perf_counter_ns()
+        trace.record(current)
+
+
+def current_span():
+    return _current_span.get()
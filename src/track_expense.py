@@ -1,14 +1,46 @@
 from pathlib import Path
 import json
-from threading import Lock
+from threading import Lock, local
 from .logger import logger
+from .llm_cache import cache_stats
+from .tracing import current_span
+from .metrics import model_name, llm_cost, llm_tokens
 import os
 expense_lock = Lock()
+_call_state = local()
 
+# per token, USD price per 1M tokens converted at 90.56
+INPUT_COST_PER_TOKEN = 0.15 / 1000000 * 90.56
+OUTPUT_COST_PER_TOKEN = 1.50 / 1000000 * 90.56
+
+
+def set_hedged(hedged: bool):
+    """Mark model calls made by this thread as hedge duplicates"""
+    _call_state.hedged = hedged
+
+
+def is_hedged() -> bool:
+    return getattr(_call_state, "hedged", False)
 
 
 def update_expense_log(component_name: str, usage: dict):
-    
+    hedged = is_hedged()
+    if hedged:
+        component_name = f"{component_name} [hedge]"
+
+    input_tokens = usage.get("input_tokens", 0) or 0
+    output_tokens = usage.get("output_tokens", 0) or 0
+
+    call_span = current_span()
+    if call_span:
+        call_span.add(input_tokens=input_tokens, output_tokens=output_tokens)
+
+    model = model_name()
+    llm_tokens.inc(input_tokens, model=model, direction="input")
+    llm_tokens.inc(output_tokens, model=model, direction="output")
+    llm_cost.inc(input_tokens * INPUT_COST_PER_TOKEN, model=model, direction="input")
+    llm_cost.inc(output_tokens * OUTPUT_COST_PER_TOKEN, model=model, direction="output")
+
     with expense_lock:
         expense_file = Path(os.getenv("EXPENSE_FILE"))
         os.makedirs("temp", exist_ok=True)
@@ -27,6 +59,7 @@ def update_expense_log(component_name: str, usage: dict):
             "input_tokens": usage.get("input_tokens", 0),
             "output_tokens": usage.get("output_tokens", 0),
             "total_tokens": usage.get("total_tokens", 0),
+            "hedged": hedged,
         }
 
         tmp_file = expense_file.with_suffix(".tmp")
@@ -42,24 +75,29 @@ def update_expense_log(component_name: str, usage: dict):
 def calculate_total_expense():
     expense_file = Path("temp/expense.json")
 
-    if not expense_file.exists():
+    data = {}
+    if expense_file.exists():
+        with open(expense_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    else:
         logger.warning("expense.json not found.")
-        return
-
-    with open(expense_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
 
     total_input = 0
     total_output = 0
     total_tokens = 0
+    hedged_calls = 0
+    hedged_tokens = 0
 
     for file, usage in data.items():
         total_input += usage.get("input_tokens", 0)
         total_output += usage.get("output_tokens", 0)
         total_tokens += usage.get("total_tokens", 0)
+        if usage.get("hedged"):
+            hedged_calls += 1
+            hedged_tokens += usage.get("total_tokens", 0)
 
-    input_cost = ((total_input / 1000000) * 0.15) * 90.56
-    output_cost = ((total_output / 1000000) * 1.50) * 90.56
+    input_cost = total_input * INPUT_COST_PER_TOKEN
+    output_cost = total_output * OUTPUT_COST_PER_TOKEN
     
     total_cost = input_cost + output_cost
     logger.info("====== TOKEN EXPENSE SUMMARY ======")
@@ -69,6 +107,14 @@ def calculate_total_expense():
     logger.info(f"Total Input Cost   : {input_cost:.2f}")
     logger.info(f"Total Output Cost  : {output_cost:.2f}")
     logger.info(f"Total Cost         : {total_cost:.2f}")
+    logger.info(f"Hedged Calls       : {hedged_calls} ({hedged_tokens} tokens)")
+
+    cache = cache_stats()
+    for name, stats in cache.items():
+        logger.info(
+            f"LLM Cache ({name}): {stats['hits']} hits / "
+            f"{stats['misses']} misses ({stats['hit_ratio']:.0%})"
+        )
     logger.info("===================================")
 
     return {
@@ -77,5 +123,8 @@ def calculate_total_expense():
         "total_tokens": total_tokens,
         "input_cost": input_cost,
         "output_cost": output_cost,
-        "total_cost": total_cost
+        "total_cost": total_cost,
+        "hedged_calls": hedged_calls,
+        "hedged_tokens": hedged_tokens,
+        "cache": cache
     }